@@ -27,6 +27,71 @@ LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "http://localhost:11434")
 LLM_MODEL = os.environ.get("LLM_MODEL", "")
 DEFAULT_ARTIST = os.environ.get("DEFAULT_ARTIST", "Squalus Shiraii")
 
+# ACE-Step HTTP connection pool
+ACESTEP_MAX_CONNECTIONS = int(os.environ.get("ACESTEP_MAX_CONNECTIONS", "20"))
+ACESTEP_MAX_KEEPALIVE = int(os.environ.get("ACESTEP_MAX_KEEPALIVE", "10"))
+ACESTEP_KEEPALIVE_EXPIRY = float(os.environ.get("ACESTEP_KEEPALIVE_EXPIRY", "60"))
+ACESTEP_CONNECT_TIMEOUT = float(os.environ.get("ACESTEP_CONNECT_TIMEOUT", "5"))
+ACESTEP_READ_TIMEOUT = float(os.environ.get("ACESTEP_READ_TIMEOUT", "120"))
+ACESTEP_POOL_TIMEOUT = float(os.environ.get("ACESTEP_POOL_TIMEOUT", "30"))
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get("DOWNLOAD_CHUNK_SIZE", str(256 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+
+# Circuit breakers for ACE-Step, Draw Things and the LLM provider
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", "30"))
+
+# Seconds an ACE-Step backend health result stays cached
+BACKEND_HEALTH_TTL = float(os.environ.get("BACKEND_HEALTH_TTL", "15"))
+
+# Directory ACE-Step accepts reference audio paths from (e.g. its temp dir).
+# When set, persona reference audio is staged there once by content hash.
+ACESTEP_STAGING_DIR = os.environ.get("ACESTEP_STAGING_DIR", "")
+REF_AUDIO_CACHE_SIZE = int(os.environ.get("REF_AUDIO_CACHE_SIZE", "64"))
+
+# Opt-in cache of finished renders keyed on ACE-Step params + seed
+GENERATION_CACHE_MAX_ENTRIES = int(os.environ.get("GENERATION_CACHE_MAX_ENTRIES", "500"))
+
+# ACE-Step batched polling
+POLL_MIN_INTERVAL = float(os.environ.get("POLL_MIN_INTERVAL", "0.5"))
+POLL_MAX_INTERVAL = float(os.environ.get("POLL_MAX_INTERVAL", "5.0"))
+POLL_INTERVAL_PER_TASK = float(os.environ.get("POLL_INTERVAL_PER_TASK", "0.2"))
+POLL_BATCH_SIZE = int(os.environ.get("POLL_BATCH_SIZE", "50"))
+# Per-task adaptive delay bounds (seconds)
+POLL_MIN_DELAY = float(os.environ.get("POLL_MIN_DELAY", "0.5"))
+POLL_MAX_DELAY = float(os.environ.get("POLL_MAX_DELAY", "15.0"))
+
+# Persistent job queue: concurrent ACE-Step jobs, idle re-check interval and
+# back-off before retrying a job requeued because ACE-Step was unavailable
+JOB_WORKERS_MUSIC = int(os.environ.get("JOB_WORKERS_MUSIC", "2"))
+# Song pipelines in progress at once; their renders still queue for the music workers
+JOB_WORKERS_PIPELINE = int(os.environ.get("JOB_WORKERS_PIPELINE", "4"))
+QUEUE_IDLE_POLL = float(os.environ.get("QUEUE_IDLE_POLL", "5.0"))
+QUEUE_RETRY_DELAY = float(os.environ.get("QUEUE_RETRY_DELAY", "10.0"))
+# Seconds job progress updates are coalesced before being written together
+JOB_STATE_FLUSH_INTERVAL = float(os.environ.get("JOB_STATE_FLUSH_INTERVAL", "0.5"))
+
+# Draw Things renders run in a thread pool off the event loop; at most
+# ART_RENDER_WORKERS at once, the rest wait for a slot
+ART_RENDER_WORKERS = int(os.environ.get("ART_RENDER_WORKERS", "1"))
+
+# Database maintenance: finished jobs older than JOB_RETENTION_DAYS are deleted
+# and their ACE-Step results trimmed after JOB_RESULT_TRIM_DAYS (0 disables
+# either); ANALYZE, and VACUUM once MAINTENANCE_VACUUM_FREE_RATIO of the file
+# is free pages, run every MAINTENANCE_INTERVAL_HOURS
+JOB_RETENTION_DAYS = float(os.environ.get("JOB_RETENTION_DAYS", "30"))
+JOB_RESULT_TRIM_DAYS = float(os.environ.get("JOB_RESULT_TRIM_DAYS", "7"))
+MAINTENANCE_INTERVAL_HOURS = float(os.environ.get("MAINTENANCE_INTERVAL_HOURS", "6"))
+MAINTENANCE_VACUUM_FREE_RATIO = float(os.environ.get("MAINTENANCE_VACUUM_FREE_RATIO", "0.2"))
+
+# SQLite connection tuning (see app/database.py): how long a connection waits
+# for a lock, page cache and memory-mapped I/O sizes, and how long a session
+# waits for its turn to write before giving up
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+SQLITE_MMAP_SIZE_MB = int(os.environ.get("SQLITE_MMAP_SIZE_MB", "256"))
+SQLITE_WRITE_LOCK_TIMEOUT = float(os.environ.get("SQLITE_WRITE_LOCK_TIMEOUT", "30"))
+
 DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
 
 # Ensure data directories exist
@@ -1,21 +1,215 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy.orm import DeclarativeBase
+"""Engine, sessions and schema migration for the SQLite database.
 
-from app.config import DATABASE_URL
+Every connection is switched to WAL (readers never block on a writer or the
+other way round), waits up to SQLITE_BUSY_TIMEOUT_MS for locks instead of
+failing with "database is locked", syncs only at checkpoints
+(synchronous=NORMAL, safe under WAL) and gets a larger page cache and mmap.
+
+SQLite still allows a single writer. Sessions from async_session therefore
+queue for a process-wide write lock as soon as they write (flush, or an
+INSERT/UPDATE/DELETE statement) and hold it until their transaction ends, so
+writers take turns in the event loop instead of spinning on SQLite's lock.
+Reads never take it.
+"""
+
+import asyncio
+import logging
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.util import await_only
+
+from app.config import (
+    DATABASE_URL, SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE_MB, SQLITE_WRITE_LOCK_TIMEOUT,
+)
+
+log = logging.getLogger(__name__)
 
 
 class Base(DeclarativeBase):
     pass
 
 
-engine = create_async_engine(DATABASE_URL, echo=False)
-async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+def _apply_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def create_engine(url: str = DATABASE_URL, tuned: bool = True) -> AsyncEngine:
+    """An async SQLite engine, with the connection pragmas above unless tuned is False."""
+    new_engine = create_async_engine(url, echo=False)
+    if tuned:
+        event.listen(new_engine.sync_engine, "connect", _apply_pragmas)
+    return new_engine
+
+
+class WriteLock:
+    """Process-wide turn-taking for writers; re-entrant within one asyncio task.
+
+    A handler may open a second session while its first one is mid-write;
+    letting the same task through avoids waiting on itself.
+    """
+
+    def __init__(self, timeout: float = SQLITE_WRITE_LOCK_TIMEOUT):
+        self.timeout = timeout
+        self._lock = asyncio.Lock()
+        self._owner: asyncio.Task | None = None
+        self._depth = 0
+        self._acquired_at = 0.0
+        self.acquisitions = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_hold_seconds = 0.0
+
+    async def acquire(self):
+        task = asyncio.current_task()
+        if self._owner is task and task is not None:
+            self._depth += 1
+            return
+        if self._lock.locked():
+            self.waits += 1
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(self._lock.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Timed out after {self.timeout:.0f}s waiting for the database write lock") from None
+            self.wait_seconds += time.monotonic() - started
+        else:
+            await self._lock.acquire()
+        self._owner, self._depth = task, 1
+        self._acquired_at = time.monotonic()
+        self.acquisitions += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth > 0:
+            return
+        self.max_hold_seconds = max(self.max_hold_seconds, time.monotonic() - self._acquired_at)
+        self._owner = None
+        self._lock.release()
+
+    def stats(self) -> dict:
+        return {
+            "held": self._lock.locked(),
+            "acquisitions": self.acquisitions,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "max_hold_seconds": round(self.max_hold_seconds, 3),
+        }
+
+
+write_lock = WriteLock()
+
+
+class WriterSession(Session):
+    """Session that takes write_lock before its first write and releases it when the transaction ends."""
+
+
+def _take_write_lock(session: Session):
+    if not session.info.get("write_lock"):
+        if not session.in_transaction():
+            # Make sure a transaction end will release the lock
+            session.begin()
+        # Runs inside the AsyncSession's greenlet, so it can wait on the event loop
+        await_only(write_lock.acquire())
+        session.info["write_lock"] = True
+
+
+@event.listens_for(WriterSession, "before_flush")
+def _before_flush(session, flush_context, instances):
+    _take_write_lock(session)
+
+
+@event.listens_for(WriterSession, "do_orm_execute")
+def _before_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _take_write_lock(orm_execute_state.session)
+
+
+@event.listens_for(WriterSession, "after_transaction_end")
+def _after_transaction_end(session, transaction):
+    if transaction.parent is None and session.info.pop("write_lock", False):
+        write_lock.release()
+
+
+def session_factory(bind: AsyncEngine) -> async_sessionmaker:
+    return async_sessionmaker(bind, class_=AsyncSession, sync_session_class=WriterSession, expire_on_commit=False)
+
+
+engine = create_engine()
+async_session = session_factory(engine)
+
+
+# Bumped whenever _migrate() gains a step; stored in PRAGMA user_version
+SCHEMA_VERSION = 4
 
 
 async def init_db():
-    from app.models import Song, Persona, Setting, Job  # noqa: F401
+    from app.models import Song, Persona, Setting, Job, GenerationCache  # noqa: F401
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_migrate)
+
+
+def _migrate(conn):
+    """Bring an existing squalus.db up to the current models, in place.
+
+    Every step only adds (columns, indexes), so no data is rewritten or lost.
+    """
+    from app.services import search
+
+    version = conn.execute(text("PRAGMA user_version")).scalar() or 0
+    _add_missing_columns(conn)
+    # Full-text index over songs; built from existing rows the first time
+    search.install(conn)
+    if version < SCHEMA_VERSION:
+        _add_missing_indexes(conn)
+        conn.execute(text("ANALYZE"))
+        conn.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION}"))
+
+
+def _add_missing_columns(conn):
+    """Add columns declared on the models but missing from an existing database.
+
+    create_all() only creates new tables, so columns added to a model later
+    would otherwise be absent from older squalus.db files.
+    """
+    for table in Base.metadata.sorted_tables:
+        existing = {row[1] for row in conn.execute(text(f'PRAGMA table_info("{table.name}")'))}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            col_type = column.type.compile(dialect=conn.dialect)
+            ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}'
+            if column.default is not None and column.default.is_scalar:
+                ddl += f" DEFAULT {_sql_literal(column.default.arg)}"
+            conn.execute(text(ddl))
+
+
+def _add_missing_indexes(conn):
+    """Create indexes declared on the models but missing from an existing database.
+
+    Like columns, create_all() only creates indexes together with new tables.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _sql_literal(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
 
 
 async def get_db():
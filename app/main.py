@@ -6,6 +6,13 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
 from app.database import init_db
+from app.services import http_pool
+from app.services import music as music_svc
+from app.services.poller import task_poller
+from app.services.job_queue import job_queue
+from app.services.job_state import job_state
+from app.services.maintenance import maintenance
+from app.services.settings_cache import settings_cache
 
 STATIC_DIR = Path(__file__).parent / "static"
 
@@ -13,13 +20,26 @@ STATIC_DIR = Path(__file__).parent / "static"
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
-    yield
+    await settings_cache.load()
+    acestep_client = http_pool.create_client()
+    music_svc.set_client(acestep_client)
+    await job_queue.start()
+    maintenance.start()
+    try:
+        yield
+    finally:
+        await maintenance.stop()
+        await job_queue.stop()
+        await job_state.stop()
+        await task_poller.stop()
+        music_svc.set_client(None)
+        await acestep_client.aclose()
 
 
 app = FastAPI(title="Squalus Shiraii", lifespan=lifespan)
 
 # --- Routers (added as phases are built) ---
-from app.routers import songs, create, lyrics, music, art, personas, tts, jobs, settings  # noqa: E402
+from app.routers import songs, create, lyrics, music, art, personas, tts, jobs, settings, health  # noqa: E402
 
 app.include_router(songs.router, prefix="/api/songs", tags=["songs"])
 app.include_router(create.router, prefix="/api/create", tags=["create"])
@@ -30,6 +50,7 @@ app.include_router(personas.router, prefix="/api/personas", tags=["personas"])
 app.include_router(tts.router, prefix="/api/tts", tags=["tts"])
 app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
 app.include_router(settings.router, prefix="/api/settings", tags=["settings"])
+app.include_router(health.router, prefix="/api/health", tags=["health"])
 
 # Static files
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import String, Integer, Float, Boolean, Text, ForeignKey, DateTime
+from sqlalchemy import String, Integer, Float, Boolean, Text, ForeignKey, DateTime, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -58,7 +58,9 @@ class Song(Base):
     export_path: Mapped[str | None] = mapped_column(String(512), nullable=True)
     persona_id: Mapped[int | None] = mapped_column(ForeignKey("personas.id"), nullable=True)
     status: Mapped[str] = mapped_column(String(32), default="draft")
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=_utcnow)
+    # Takes generated together by /api/create/variations share a group id
+    variation_group: Mapped[str | None] = mapped_column(String(36), nullable=True, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=_utcnow, index=True)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=_utcnow, onupdate=_utcnow)
 
     persona: Mapped[Persona | None] = relationship(back_populates="songs")
@@ -66,14 +68,45 @@ class Song(Base):
 
 class Job(Base):
     __tablename__ = "jobs"
+    __table_args__ = (
+        # Queue claims: pending jobs by priority, oldest first
+        Index("ix_jobs_queue", "status", "priority", "created_at"),
+        # Retention: finished jobs by age
+        Index("ix_jobs_status_updated_at", "status", "updated_at"),
+    )
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
     job_type: Mapped[str] = mapped_column(String(64), nullable=False)
     status: Mapped[str] = mapped_column(String(32), default="pending")
     progress: Mapped[float] = mapped_column(Float, default=0.0)
     stage: Mapped[str] = mapped_column(String(128), default="")
+    eta_seconds: Mapped[float | None] = mapped_column(Float, nullable=True)
     result_json: Mapped[str | None] = mapped_column(Text, nullable=True)
     error: Mapped[str | None] = mapped_column(Text, nullable=True)
-    song_id: Mapped[int | None] = mapped_column(ForeignKey("songs.id"), nullable=True)
+    song_id: Mapped[int | None] = mapped_column(ForeignKey("songs.id"), nullable=True, index=True)
+    # Handler arguments for the job queue (JSON)
+    payload_json: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Queue scheduling: priority class (2 interactive, 1 normal, 0 batch) and fair-share client
+    priority: Mapped[int] = mapped_column(Integer, default=1)
+    client_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # ACE-Step task behind the job, kept so a restart can re-attach to it
+    backend_task_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    backend_url: Mapped[str | None] = mapped_column(String(256), nullable=True)
+    phase: Mapped[str] = mapped_column(String(32), default="queued")  # queued, submitted, downloading
+    # Jobs created together by /api/create/batch share a batch id
+    batch_id: Mapped[str | None] = mapped_column(String(36), nullable=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=_utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=_utcnow, onupdate=_utcnow)
+
+
+class GenerationCache(Base):
+    __tablename__ = "generation_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    audio_path: Mapped[str] = mapped_column(String(512), nullable=False)
+    seed: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    result_json: Mapped[str | None] = mapped_column(Text, nullable=True)
+    hits: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=_utcnow)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=_utcnow)
@@ -34,23 +34,13 @@ async def generate_art(body: dict, db: AsyncSession = Depends(get_db)):
             return {"error": "Song not found"}
         # Use LLM to craft a visual prompt from song metadata
         if not prompt:
-            try:
-                from app.services.lyrics import generate_art_prompt
-                persona_name = song.persona.name if song.persona else ""
-                prompt = await generate_art_prompt(
-                    title=song.title or "",
-                    caption=song.caption or "",
-                    lyrics=song.lyrics or "",
-                    persona_name=persona_name,
-                )
-                log.info("LLM art prompt: %s", prompt)
-            except Exception as e:
-                log.warning("LLM art prompt failed (%s), using fallback", e)
-                # Fallback to basic prompt
-                if song.caption:
-                    prompt = f"Album art for: {song.caption}, album cover art, high quality"
-                else:
-                    prompt = f"Album art for: {song.title or 'music'}, album cover art, high quality"
+            from app.services.lyrics import song_art_prompt
+            prompt = await song_art_prompt(
+                title=song.title or "",
+                caption=song.caption or "",
+                lyrics=song.lyrics or "",
+                persona_name=song.persona.name if song.persona else "",
+            )
 
     if not prompt:
         return {"error": "Provide a prompt or song_id"}
@@ -1,52 +1,67 @@
 import asyncio
 import json
 import logging
+import time
 import uuid
 import shutil
+from collections import Counter
+from datetime import datetime, timezone
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db, async_session
-from app.models import Song, Job, Setting, Persona
-from app.config import AUDIO_DIR, DEFAULT_ARTIST
+from app.models import Song, Job, Persona
+from app.config import AUDIO_DIR, ART_DIR, EXPORTS_DIR, DEFAULT_ARTIST, JOB_WORKERS_MUSIC, JOB_WORKERS_PIPELINE
 from app.services import music as music_svc
+from app.services import lyrics as lyrics_svc
+from app.services import gen_cache, task_runner
+from app.services.job_state import job_state
+from app.services.job_events import job_events, job_snapshot, TERMINAL
+from app.services.job_queue import job_queue, Requeue, PRIORITIES, parse_priority, request_client_id
+from app.services.settings_cache import settings_cache
 
 log = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Upper bound on takes per /variations request (ACE-Step batch_size)
+MAX_VARIATIONS = 8
+# Upper bound on tracks per /batch request
+MAX_BATCH_TRACKS = 50
+
 
 async def _get_setting(key: str, default: str = "") -> str:
-    async with async_session() as db:
-        row = await db.get(Setting, key)
-        return row.value if row and row.value else default
+    return await settings_cache.get(key, default)
+
+
+async def _run_generation(job_id: str, song_ids: list[int], ace_params: dict, use_cache: bool = False):
+    """Background task: submit to ACE-Step, poll, save result.
 
+    With batch_size > 1 ACE-Step returns one result per take; each is
+    downloaded (in parallel) into the matching song in song_ids.
 
-async def _run_generation(job_id: str, song_id: int, ace_params: dict):
-    """Background task: submit to ACE-Step, poll, save result."""
+    With use_cache, a single-song request with a fixed seed is first looked
+    up in the generation cache and, on a hit, reuses the cached audio file.
+    """
     async with async_session() as db:
         job = await db.get(Job, job_id)
 
         try:
-            # Update job status
-            job.status = "running"
-            job.stage = "Submitting to ACE-Step..."
-            await db.commit()
-
-            # Submit to ACE-Step
-            submit_result = await music_svc.submit_task(ace_params)
-            # Response may be wrapped: {"data": {"task_id": ...}, "code": 200}
-            payload = submit_result.get("data", submit_result) if isinstance(submit_result, dict) else submit_result
-            ace_task_id = payload.get("task_id") if isinstance(payload, dict) else None
-            if not ace_task_id:
-                raise RuntimeError(f"No task_id in ACE-Step response: {submit_result}")
+            cache_params = dict(ace_params)  # submit_task consumes reference_audio_path
+            use_cache = use_cache and len(song_ids) == 1
+            if use_cache:
+                key = await gen_cache.cache_key(cache_params, gen_cache.requested_seed(cache_params))
+                cached = await gen_cache.lookup(key)
+                if cached:
+                    await _complete_from_cache(db, job, song_ids[0], cached)
+                    return
 
-            job.stage = "Generating music..."
-            await db.commit()
+            # Update job status
+            job_state.save(job, status="running", stage="Submitting to ACE-Step...")
 
-            # Poll until done
             async def on_progress(result):
                 progress_text = result.get("progress_text", "")
                 parsed = result.get("result_parsed")
@@ -54,74 +69,121 @@ async def _run_generation(job_id: str, song_id: int, ace_params: dict):
                     p = parsed[0]
                     progress = p.get("progress", 0)
                     stage = p.get("stage", progress_text)
-                    job.progress = float(progress)
-                    job.stage = stage
+                    job_state.save(job, progress=progress, stage=stage, eta_seconds=result.get("eta_seconds"))
                 else:
-                    job.stage = progress_text
-                await db.commit()
+                    job_state.save(job, stage=progress_text, eta_seconds=result.get("eta_seconds"))
 
-            final = await music_svc.poll_until_done(ace_task_id, on_progress=on_progress)
+            # Submit to ACE-Step (or re-attach after a restart) and poll until done
+            ace_task_id, final = await task_runner.run_task(db, job, ace_params, on_progress=on_progress)
 
             # Extract result
             parsed = final.get("result_parsed")
             if not isinstance(parsed, list) or not parsed:
                 raise RuntimeError("No result data from ACE-Step")
 
-            result_entry = parsed[0]
-            audio_file = result_entry.get("file")
-            if not audio_file:
+            entries = [e for e in parsed[:len(song_ids)] if e.get("file")]
+            if not entries:
                 raise RuntimeError("No audio file in result")
 
-            # Download audio to local storage
-            audio_bytes = await music_svc.download_audio(audio_file)
-            ext = Path(audio_file).suffix or ".mp3"
-            local_name = f"{song_id}_{uuid.uuid4().hex[:8]}{ext}"
-            local_path = AUDIO_DIR / local_name
-            local_path.write_bytes(audio_bytes)
-
-            # Update song
-            song = await db.get(Song, song_id)
-            song.audio_path = str(local_path)
-            song.status = "completed"
-
-            # Fill in metadata from result
-            metas = result_entry.get("metas", {})
-            if metas.get("bpm") and not song.bpm:
-                song.bpm = int(metas["bpm"])
-            if metas.get("keyscale") and not song.key_scale:
-                song.key_scale = metas["keyscale"]
-            if metas.get("timesignature") and not song.time_signature:
-                song.time_signature = metas["timesignature"]
-            if metas.get("duration") and not song.duration:
-                song.duration = float(metas["duration"])
-            if result_entry.get("lyrics") and not song.lyrics:
-                song.lyrics = result_entry["lyrics"]
-            if result_entry.get("prompt") and not song.caption:
-                song.caption = result_entry["prompt"]
+            # Stream audio to local storage, all takes at once
+            job_state.save(job, phase="downloading", stage="Downloading audio...", eta_seconds=None)
+            local_paths = []
+            for song_id, entry in zip(song_ids, entries):
+                ext = Path(entry["file"]).suffix or ".mp3"
+                local_paths.append(AUDIO_DIR / f"{song_id}_{uuid.uuid4().hex[:8]}{ext}")
+            downloads = await asyncio.gather(*(
+                music_svc.download_audio(entry["file"], path, task_id=ace_task_id)
+                for entry, path in zip(entries, local_paths)
+            ))
+
+            # Update songs
+            for song_id, entry, path, download in zip(song_ids, entries, local_paths, downloads):
+                entry["download"] = download
+                song = await db.get(Song, song_id)
+                song.audio_path = str(path)
+                song.status = "completed"
+                song.seed = gen_cache.result_seed(entry)
+                _apply_result_metadata(song, entry)
+                if use_cache:
+                    key = await gen_cache.cache_key(cache_params, song.seed)
+                    await gen_cache.store(key, str(path), song.seed, entry)
+
+            # Takes ACE-Step did not return
+            for song_id in song_ids[len(entries):]:
+                song = await db.get(Song, song_id)
+                if song:
+                    song.status = "failed"
 
             # Update job
             job.status = "completed"
             job.progress = 1.0
             job.stage = "Done"
-            job.result_json = json.dumps(result_entry)
-            await db.commit()
+            job.eta_seconds = None
+            job.result_json = json.dumps(entries[0] if len(song_ids) == 1 else entries)
+            await job_state.finish(db, job)
 
+        except Requeue:
+            raise
         except Exception as e:
             log.exception("Job %s failed: %s", job_id, e)
             job.status = "failed"
             job.error = str(e)
             job.stage = "Failed"
+            await job_state.finish(db, job)
+
+            # Mark songs as failed too
+            for song_id in song_ids:
+                song = await db.get(Song, song_id)
+                if song:
+                    song.status = "failed"
             await db.commit()
 
-            # Mark song as failed too
-            song = await db.get(Song, song_id)
-            if song:
-                song.status = "failed"
-                await db.commit()
+
+async def _generation_handler(job_id: str, payload: dict):
+    await _run_generation(job_id, payload["song_ids"], payload["ace_params"], payload.get("use_cache", False))
+
+
+job_queue.register(
+    ("simple_create", "custom_create", "variations"), _generation_handler,
+    pool="music", workers=JOB_WORKERS_MUSIC,
+)
+
+
+async def _complete_from_cache(db: AsyncSession, job: Job, song_id: int, cached: dict):
+    """Finish a job from a generation cache hit without touching ACE-Step."""
+    song = await db.get(Song, song_id)
+    song.audio_path = cached["audio_path"]
+    song.seed = cached["seed"]
+    song.status = "completed"
+    _apply_result_metadata(song, cached["result"])
+
+    job.status = "completed"
+    job.progress = 1.0
+    job.stage = "Done (cached)"
+    job.eta_seconds = None
+    job.result_json = json.dumps({**cached["result"], "cached": True})
+    await job_state.finish(db, job)
+
+
+def _apply_result_metadata(song: Song, result_entry: dict):
+    """Fill in song metadata ACE-Step chose, without overwriting user input."""
+    metas = result_entry.get("metas", {})
+    if metas.get("bpm") and not song.bpm:
+        song.bpm = int(metas["bpm"])
+    if metas.get("keyscale") and not song.key_scale:
+        song.key_scale = metas["keyscale"]
+    if metas.get("timesignature") and not song.time_signature:
+        song.time_signature = metas["timesignature"]
+    if metas.get("duration") and not song.duration:
+        song.duration = float(metas["duration"])
+    if result_entry.get("lyrics") and not song.lyrics:
+        song.lyrics = result_entry["lyrics"]
+    if result_entry.get("prompt") and not song.caption:
+        song.caption = result_entry["prompt"]
 
 
 @router.post("/simple")
-async def create_simple(body: dict, bg: BackgroundTasks, db: AsyncSession = Depends(get_db)):
+async def create_simple(body: dict, request: Request, db: AsyncSession = Depends(get_db)):
     """Simple creation: description + optional styles + instrumental toggle."""
     description = body.get("description", "").strip()
     styles = body.get("styles", [])
@@ -129,6 +191,11 @@ async def create_simple(body: dict, bg: BackgroundTasks, db: AsyncSession = Depe
 
     if not description:
         return {"error": "Description is required"}
+    try:
+        priority = parse_priority(body.get("priority"), job_queue.default_priority("simple_create"))
+        _parse_seed(body.get("seed"))
+    except ValueError as e:
+        return {"error": str(e)}
 
     # Build caption from description + styles
     caption = description
@@ -152,11 +219,8 @@ async def create_simple(body: dict, bg: BackgroundTasks, db: AsyncSession = Depe
     job = Job(
         id=str(uuid.uuid4()),
         job_type="simple_create",
-        status="pending",
         song_id=song.id,
     )
-    db.add(job)
-    await db.commit()
 
     # Build ACE-Step params
     # Don't use sample_mode - it lets ACE-Step's LLM pick language/style freely.
@@ -172,69 +236,514 @@ async def create_simple(body: dict, bg: BackgroundTasks, db: AsyncSession = Depe
         "use_format": True,
         "batch_size": 1,
     }
+    _apply_seed(body, ace_params)
 
-    bg.add_task(_run_generation, job.id, song.id, ace_params)
+    await job_queue.enqueue(db, job, {
+        "song_ids": [song.id], "ace_params": ace_params, "use_cache": bool(body.get("use_cache")),
+    }, priority=priority, client_id=request_client_id(request))
 
     return {"job_id": job.id, "song_id": song.id}
 
 
 @router.post("/custom")
-async def create_custom(body: dict, bg: BackgroundTasks, db: AsyncSession = Depends(get_db)):
+async def create_custom(body: dict, request: Request, db: AsyncSession = Depends(get_db)):
     """Custom creation: full params including lyrics, caption, BPM, key, etc."""
     lyrics = body.get("lyrics", "").strip()
     caption = body.get("caption", "").strip()
-    instrumental = body.get("instrumental", False)
-    persona_id = body.get("persona_id")
 
     if not lyrics and not caption:
         return {"error": "Provide lyrics or a caption"}
+    try:
+        priority = parse_priority(body.get("priority"), job_queue.default_priority("custom_create"))
+        _parse_seed(body.get("seed"))
+    except ValueError as e:
+        return {"error": str(e)}
+
+    persona = await _load_persona(db, body.get("persona_id"))
+    artist = await _get_setting("default_artist", DEFAULT_ARTIST)
+    effective_caption = _persona_caption(persona, caption)
+
+    song = _custom_song(body, artist, effective_caption, lyrics)
+    db.add(song)
+    await db.flush()
+
+    job = Job(
+        id=str(uuid.uuid4()),
+        job_type="custom_create",
+        song_id=song.id,
+    )
+    ace_params = _custom_ace_params(body, persona, effective_caption, lyrics)
+
+    await job_queue.enqueue(db, job, {
+        "song_ids": [song.id], "ace_params": ace_params, "use_cache": bool(body.get("use_cache")),
+    }, priority=priority, client_id=request_client_id(request))
+
+    return {"job_id": job.id, "song_id": song.id}
 
-    # Load persona if selected
-    persona = None
-    if persona_id:
-        persona = await db.get(Persona, int(persona_id))
 
+@router.post("/variations")
+async def create_variations(body: dict, request: Request, db: AsyncSession = Depends(get_db)):
+    """Several takes of one idea from a single ACE-Step task (batch_size=count).
+
+    Takes the same fields as /custom plus "count". Creates one song per take,
+    linked as siblings through a shared variation_group.
+    """
+    lyrics = body.get("lyrics", "").strip()
+    caption = body.get("caption", "").strip()
+
+    if not lyrics and not caption:
+        return {"error": "Provide lyrics or a caption"}
+    try:
+        count = int(body.get("count", 4))
+    except (TypeError, ValueError):
+        return {"error": "count must be a number"}
+    if not 2 <= count <= MAX_VARIATIONS:
+        return {"error": f"count must be between 2 and {MAX_VARIATIONS}"}
+    try:
+        priority = parse_priority(body.get("priority"), job_queue.default_priority("variations"))
+        _parse_seed(body.get("seed"))
+    except ValueError as e:
+        return {"error": str(e)}
+
+    persona = await _load_persona(db, body.get("persona_id"))
     artist = await _get_setting("default_artist", DEFAULT_ARTIST)
+    effective_caption = _persona_caption(persona, caption)
+
+    group = str(uuid.uuid4())
+    songs = []
+    for i in range(count):
+        song = _custom_song(body, artist, effective_caption, lyrics)
+        song.title = f"{song.title} (take {i + 1})"
+        song.variation_group = group
+        db.add(song)
+        songs.append(song)
+    await db.flush()
 
-    # Incorporate persona description into the caption for vocal style guidance
-    effective_caption = caption
-    if persona and persona.description:
-        if effective_caption:
-            effective_caption = persona.description.strip() + ", " + effective_caption
-        else:
-            effective_caption = persona.description.strip()
+    job = Job(
+        id=str(uuid.uuid4()),
+        job_type="variations",
+        song_id=songs[0].id,
+    )
+    ace_params = _custom_ace_params(body, persona, effective_caption, lyrics)
+    ace_params["batch_size"] = count
 
-    song = Song(
-        title=body.get("title", "").strip() or "Untitled",
-        artist=artist,
-        caption=effective_caption,
-        lyrics=lyrics,
-        bpm=body.get("bpm"),
-        key_scale=body.get("key_scale", ""),
-        time_signature=body.get("time_signature", ""),
-        vocal_language=body.get("vocal_language", "en"),
-        instrumental=instrumental,
-        persona_id=persona_id,
-        status="generating",
+    song_ids = [s.id for s in songs]
+    await job_queue.enqueue(
+        db, job, {"song_ids": song_ids, "ace_params": ace_params},
+        priority=priority, client_id=request_client_id(request),
     )
+
+    return {"job_id": job.id, "song_ids": song_ids, "variation_group": group}
+
+
+@router.post("/pipeline")
+async def create_pipeline(body: dict, request: Request, db: AsyncSession = Depends(get_db)):
+    """Idea to tagged MP3 in one job: lyrics -> (music || art) -> export.
+
+    Takes the /custom fields plus "description": without lyrics the LLM
+    writes them (and fills in caption, BPM, key and duration) from the
+    description first. Album art ("art_preset", "art_model"; "art": false
+    skips it) is drawn while ACE-Step renders, and the ID3-tagged export is
+    produced at the end. The render runs as a child custom_create job in the
+    music queue; per-stage timings end up in the pipeline job's result_json.
+    """
+    description = body.get("description", "").strip()
+    lyrics = body.get("lyrics", "").strip()
+    caption = body.get("caption", "").strip()
+
+    if not description and not lyrics and not caption:
+        return {"error": "Provide a description, lyrics or a caption"}
+    try:
+        priority = parse_priority(body.get("priority"), job_queue.default_priority("pipeline"))
+        _parse_seed(body.get("seed"))
+    except ValueError as e:
+        return {"error": str(e)}
+
+    persona = await _load_persona(db, body.get("persona_id"))
+    artist = await _get_setting("default_artist", DEFAULT_ARTIST)
+
+    job, payload = await _new_pipeline(db, body, persona, artist)
+    await job_queue.enqueue(db, job, payload, priority=priority, client_id=request_client_id(request))
+
+    return {"job_id": job.id, "song_id": job.song_id}
+
+
+@router.post("/batch")
+async def create_batch(body: dict, request: Request, db: AsyncSession = Depends(get_db)):
+    """An album in one request: one pipeline job per track, sharing a batch id.
+
+    "tracks" lists descriptions, or per-track /pipeline bodies; every other
+    field (styles, instrumental, persona_id, art, ...) applies to all
+    tracks. Tracks queue at batch priority unless "priority" says otherwise.
+    The music workers bound how many render at once, while the pipeline
+    workers write lyrics and draw art for the next tracks meanwhile.
+
+    A batch survives a restart: queued tracks stay pending, and tracks in
+    progress resume from their last finished stage, waiting on (not
+    re-submitting) the render they had already started.
+    """
+    tracks = body.get("tracks")
+    if not isinstance(tracks, list) or not tracks:
+        return {"error": "tracks must be a non-empty list"}
+    if len(tracks) > MAX_BATCH_TRACKS:
+        return {"error": f"At most {MAX_BATCH_TRACKS} tracks per batch"}
+    try:
+        priority = parse_priority(body.get("priority"), PRIORITIES["batch"])
+    except ValueError as e:
+        return {"error": str(e)}
+
+    shared = {k: v for k, v in body.items() if k not in ("tracks", "priority", "styles")}
+    styles = body.get("styles", [])
+    bodies = []
+    for i, track in enumerate(tracks, 1):
+        track_body = {**shared, **({"description": track} if isinstance(track, str) else track)}
+        description = str(track_body.get("description") or "").strip()
+        if styles and description:
+            track_body["description"] = ", ".join(styles) + ", " + description
+        lyrics = str(track_body.get("lyrics") or "").strip()
+        caption = str(track_body.get("caption") or "").strip()
+        if not description and not lyrics and not caption:
+            return {"error": f"Track {i}: provide a description, lyrics or a caption"}
+        try:
+            _parse_seed(track_body.get("seed"))
+        except ValueError as e:
+            return {"error": f"Track {i}: {e}"}
+        bodies.append(track_body)
+
+    artist = await _get_setting("default_artist", DEFAULT_ARTIST)
+    personas = {}
+    batch_id = str(uuid.uuid4())
+    items = []
+    for track_body in bodies:
+        persona_id = track_body.get("persona_id")
+        if persona_id not in personas:
+            personas[persona_id] = await _load_persona(db, persona_id)
+        job, payload = await _new_pipeline(db, track_body, personas[persona_id], artist)
+        job.batch_id = batch_id
+        items.append((job, payload))
+    await job_queue.enqueue_many(db, items, priority=priority, client_id=request_client_id(request))
+
+    return {
+        "batch_id": batch_id,
+        "job_ids": [job.id for job, _ in items],
+        "song_ids": [job.song_id for job, _ in items],
+    }
+
+
+@router.get("/batch/{batch_id}")
+async def batch_status(batch_id: str, db: AsyncSession = Depends(get_db)):
+    """Aggregate progress and throughput of a batch, with each track's state."""
+    jobs = (await db.execute(
+        select(Job).where(Job.batch_id == batch_id).order_by(Job.created_at, Job.id)
+    )).scalars().all()
+    if not jobs:
+        raise HTTPException(404, "Batch not found")
+
+    tracks = []
+    for job in jobs:
+        latest = job_events.latest(job.id)
+        # Progress reaches the database in batches; the bus has the current state
+        data = latest[1] if latest and job.status not in TERMINAL else job_snapshot(job)
+        tracks.append({k: data[k] for k in ("id", "song_id", "status", "progress", "stage", "error")})
+
+    counts = Counter(t["status"] for t in tracks)
+    finished = sum(counts[s] for s in TERMINAL)
+    progress = sum(1.0 if t["status"] in TERMINAL else t["progress"] or 0.0 for t in tracks) / len(tracks)
+
+    # Throughput over the time the batch has been running
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    started = min((_naive(j.started_at) for j in jobs if j.started_at), default=None)
+    ended = max(_naive(j.updated_at) for j in jobs) if finished == len(jobs) else now
+    hours = (ended - started).total_seconds() / 3600 if started else 0.0
+    songs_per_hour = counts["completed"] / hours if hours > 0 else None
+    remaining = len(jobs) - finished
+    eta_seconds = round(remaining / songs_per_hour * 3600) if songs_per_hour and remaining else None
+
+    return {
+        "batch_id": batch_id,
+        "total": len(jobs),
+        "counts": dict(counts),
+        "progress": round(progress, 3),
+        "elapsed_seconds": round(hours * 3600, 1),
+        "songs_per_hour": round(songs_per_hour, 2) if songs_per_hour else None,
+        "eta_seconds": eta_seconds,
+        "tracks": tracks,
+    }
+
+
+def _naive(dt: datetime) -> datetime:
+    """SQLite hands back naive UTC datetimes; compare everything that way."""
+    return dt.replace(tzinfo=None) if dt.tzinfo else dt
+
+
+async def _new_pipeline(db: AsyncSession, body: dict, persona: Persona | None, artist: str) -> tuple[Job, dict]:
+    """Song and (not yet enqueued) pipeline job for a /pipeline body."""
+    description = (body.get("description") or "").strip()
+    song = _custom_song(body, artist, _persona_caption(persona, (body.get("caption") or "").strip()),
+                        (body.get("lyrics") or "").strip())
+    if not (body.get("title") or "").strip() and description:
+        song.title = description[:60]
     db.add(song)
     await db.flush()
 
     job = Job(
         id=str(uuid.uuid4()),
-        job_type="custom_create",
-        status="pending",
+        job_type="pipeline",
         song_id=song.id,
     )
-    db.add(job)
-    await db.commit()
+    return job, {"song_id": song.id, "body": body}
+
 
+# Share of pipeline progress per stage; art runs alongside music and is not counted
+_PIPELINE_WEIGHTS = {"lyrics": 0.1, "music": 0.8, "export": 0.1}
+
+
+async def _run_pipeline(job_id: str, song_id: int, body: dict):
+    """Background: run the pipeline stages, resuming after the last finished one."""
+    async with async_session() as db:
+        job = await db.get(Job, job_id)
+        song = await db.get(Song, song_id)
+        # Survives restarts: finished stages are skipped, a queued render is waited on
+        state = json.loads(job.result_json or "{}")
+        stages = state.setdefault("stages", {})
+        state.setdefault("started_at", datetime.now(timezone.utc).isoformat())
+        labels: dict[str, str] = {}
+        partial: dict[str, float] = {}
+
+        def report(name: str, label: str, stage_progress: float = 0.0, eta=None):
+            labels[name] = label
+            partial[name] = stage_progress
+            progress = sum(
+                weight * (1.0 if stages.get(n, {}).get("status") in ("completed", "skipped") else partial.get(n, 0.0))
+                for n, weight in _PIPELINE_WEIGHTS.items()
+            )
+            fields = {"progress": progress, "stage": " | ".join(labels.values())}
+            if name == "music":
+                fields["eta_seconds"] = eta
+            job_state.save(job, **fields)
+
+        async def checkpoint():
+            job.result_json = json.dumps(state)
+            await db.commit()
+
+        try:
+            job_state.save(job, status="running", stage="Starting pipeline...")
+
+            if "lyrics" not in stages:
+                if (body.get("lyrics") or "").strip() or not (body.get("description") or "").strip():
+                    stages["lyrics"] = {"status": "skipped"}
+                else:
+                    report("lyrics", "Writing lyrics...")
+                    written = await _timed(stages, "lyrics", lyrics_svc.generate_lyrics(
+                        body["description"].strip(), instrumental=bool(body.get("instrumental")),
+                    ))
+                    await _apply_written_lyrics(db, song, body, state, written)
+                labels.pop("lyrics", None)
+                await checkpoint()
+
+            # Music and art only need the lyrics and caption; run them side by side
+            parallel = []
+            if stages.get("music", {}).get("status") != "completed":
+                parallel.append(_timed(stages, "music", _pipeline_music(job, song, body, state, report)))
+            if "art" not in stages or stages["art"]["status"] == "running":
+                if body.get("art", True):
+                    parallel.append(_timed(stages, "art", _pipeline_art(song, body, state, report), required=False))
+                else:
+                    stages["art"] = {"status": "skipped"}
+            await asyncio.gather(*parallel)
+            await db.refresh(song)
+            if state.get("art_path"):
+                song.art_path = state["art_path"]
+            await checkpoint()
+
+            labels.clear()
+            if stages.get("export", {}).get("status") != "completed":
+                report("export", "Exporting MP3...")
+                from app.services.export import export_mp3
+                song.export_path = await _timed(stages, "export", export_mp3(
+                    audio_path=song.audio_path,
+                    # Keyed on the song: pipelines often share a title ("Untitled")
+                    output_path=EXPORTS_DIR / f"{song.id}.mp3",
+                    title=song.title,
+                    artist=song.artist,
+                    lyrics=song.lyrics,
+                    art_path=song.art_path,
+                ))
+
+            elapsed = datetime.now(timezone.utc) - datetime.fromisoformat(state["started_at"])
+            state["total_seconds"] = round(elapsed.total_seconds(), 3)
+            job.result_json = json.dumps(state)
+            job.status = "completed"
+            job.progress = 1.0
+            job.stage = "Done"
+            job.eta_seconds = None
+            await job_state.finish(db, job)
+
+        except asyncio.CancelledError:
+            # Cancelling the pipeline takes its render with it. On shutdown both
+            # are left running in the table so _recover() resumes them together.
+            music_job_id = state.get("music_job_id")
+            if music_job_id and job_queue.is_cancelling(job_id):
+                outcome = await job_queue.cancel(music_job_id)
+                if outcome and outcome["backend_task_id"]:
+                    await music_svc.cancel_task(outcome["backend_task_id"])
+            raise
+        except Exception as e:
+            log.exception("Pipeline %s failed: %s", job_id, e)
+            job.status = "failed"
+            job.error = str(e)
+            job.stage = "Failed"
+            job.result_json = json.dumps(state)
+            if song.status == "generating":
+                song.status = "failed"
+            await job_state.finish(db, job)
+
+
+async def _timed(stages: dict, name: str, coro, required: bool = True):
+    """Await a stage, recording its status and duration in stages[name]."""
+    started = time.monotonic()
+    stages[name] = {"status": "running", "started_at": datetime.now(timezone.utc).isoformat()}
+    try:
+        result = await coro
+    except Exception as e:
+        stages[name].update(status="failed", error=str(e), seconds=round(time.monotonic() - started, 3))
+        if required:
+            raise
+        log.warning("Pipeline stage %s failed: %s", name, e)
+        return None
+    stages[name].update(status="completed", seconds=round(time.monotonic() - started, 3))
+    return result
+
+
+async def _apply_written_lyrics(db: AsyncSession, song: Song, body: dict, state: dict, written: dict):
+    """Fill the song with what the LLM wrote, without overwriting user input."""
+    if written.get("error"):
+        raise RuntimeError(written["error"])
+    song.lyrics = written.get("lyrics", "")
+    if not (body.get("caption") or "").strip() and written.get("caption"):
+        persona = await _load_persona(db, body.get("persona_id"))
+        song.caption = _persona_caption(persona, written["caption"])
+    if not song.bpm and written.get("bpm"):
+        song.bpm = written["bpm"]
+    if not song.key_scale and written.get("key_scale"):
+        song.key_scale = written["key_scale"]
+    if not song.time_signature and written.get("time_signature"):
+        song.time_signature = written["time_signature"]
+    if written.get("duration"):
+        # A target for ACE-Step; song.duration is set from the rendered audio
+        state["duration"] = written["duration"]
+
+
+async def _pipeline_music(job: Job, song: Song, body: dict, state: dict, report):
+    """Render through a child custom_create job and wait for it."""
+    music_job_id = state.get("music_job_id")
+    if music_job_id is None:
+        async with async_session() as db:
+            persona = await _load_persona(db, body.get("persona_id"))
+            params = _custom_ace_params({
+                **body,
+                "bpm": song.bpm,
+                "key_scale": song.key_scale,
+                "time_signature": song.time_signature,
+                "duration": body.get("duration") or state.get("duration"),
+            }, persona, song.caption, song.lyrics)
+            child = Job(id=str(uuid.uuid4()), job_type="custom_create", song_id=song.id)
+            # Record the child before it can start, so a restart waits on it instead of rendering twice
+            state["music_job_id"] = child.id
+            parent = await db.get(Job, job.id)
+            parent.result_json = json.dumps(state)
+            await job_queue.enqueue(db, child, {
+                "song_ids": [song.id], "ace_params": params, "use_cache": bool(body.get("use_cache")),
+            }, priority=job.priority, client_id=job.client_id)
+        music_job_id = child.id
+
+    def on_update(data: dict):
+        waiting = f"#{data['queue_position']} in queue" if data.get("queue_position") else data.get("stage") or "Queued"
+        report("music", f"Music: {waiting}", data.get("progress") or 0.0, data.get("eta_seconds"))
+
+    final = await job_queue.wait(music_job_id, on_update)
+    if final["status"] != "completed":
+        raise RuntimeError(f"Music {final['status']}: {final.get('error') or ''}".strip(": "))
+    report("music", "Music: done", 1.0)
+
+
+async def _pipeline_art(song: Song, body: dict, state: dict, report):
+    from app.services import image as image_svc
+    from app.services.lyrics import song_art_prompt
+
+    report("art", "Art: drawing...")
+    persona_name = ""
+    if song.persona_id:
+        async with async_session() as db:
+            persona = await db.get(Persona, song.persona_id)
+            persona_name = persona.name if persona else ""
+    try:
+        prompt = await song_art_prompt(
+            title=song.title or "", caption=song.caption or "", lyrics=song.lyrics or "", persona_name=persona_name,
+        )
+        path = await image_svc.generate_art(
+            prompt=prompt,
+            output_path=ART_DIR / f"{song.id}_{uuid.uuid4().hex[:8]}.png",
+            preset_name=body.get("art_preset", ""),
+            model=body.get("art_model", ""),
+            width=1024,
+            height=1024,
+        )
+    except Exception:
+        report("art", "Art: failed")
+        raise
+    state["art_path"] = path
+    report("art", "Art: done")
+
+
+async def _pipeline_handler(job_id: str, payload: dict):
+    await _run_pipeline(job_id, payload["song_id"], payload["body"])
+
+
+# Pipelines only wait on their child jobs, which are pre-empted instead
+job_queue.register(
+    "pipeline", _pipeline_handler, pool="pipeline", workers=JOB_WORKERS_PIPELINE, preemptible=False,
+)
+
+
+async def _load_persona(db: AsyncSession, persona_id) -> Persona | None:
+    if not persona_id:
+        return None
+    return await db.get(Persona, int(persona_id))
+
+
+def _persona_caption(persona: Persona | None, caption: str) -> str:
+    """Incorporate persona description into the caption for vocal style guidance."""
+    if persona and persona.description:
+        if caption:
+            return persona.description.strip() + ", " + caption
+        return persona.description.strip()
+    return caption
+
+
+def _custom_song(body: dict, artist: str, caption: str, lyrics: str) -> Song:
+    return Song(
+        title=(body.get("title") or "").strip() or "Untitled",
+        artist=artist,
+        caption=caption,
+        lyrics=lyrics,
+        bpm=body.get("bpm"),
+        key_scale=body.get("key_scale") or "",
+        time_signature=body.get("time_signature") or "",
+        vocal_language=body.get("vocal_language") or "en",
+        instrumental=bool(body.get("instrumental")),
+        persona_id=body.get("persona_id"),
+        status="generating",
+    )
+
+
+def _custom_ace_params(body: dict, persona: Persona | None, caption: str, lyrics: str) -> dict:
     # Use more inference steps when reference audio is provided for better conditioning
     has_ref_audio = persona and persona.ref_audio_path and Path(persona.ref_audio_path).exists()
     steps = 20 if has_ref_audio else 8
 
     ace_params = {
-        "prompt": effective_caption,
+        "prompt": caption,
         "lyrics": lyrics,
         "vocal_language": body.get("vocal_language", "en"),
         "use_random_seed": True,
@@ -262,6 +771,23 @@ async def create_custom(body: dict, bg: BackgroundTasks, db: AsyncSession = Depe
         log.info("Using persona '%s' ref audio: %s (steps=%d, cover_strength=%.2f)",
                  persona.name, persona.ref_audio_path, steps, voice_strength)
 
-    bg.add_task(_run_generation, job.id, song.id, ace_params)
+    _apply_seed(body, ace_params)
+    return ace_params
 
-    return {"job_id": job.id, "song_id": song.id}
+
+def _parse_seed(value) -> int | None:
+    """A request's fixed seed, or None for a random one."""
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError("seed must be a whole number")
+
+
+def _apply_seed(body: dict, ace_params: dict):
+    """Use a fixed seed when the request supplies one."""
+    seed = _parse_seed(body.get("seed"))
+    if seed is not None:
+        ace_params["use_random_seed"] = False
+        ace_params["seed"] = seed
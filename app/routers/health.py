@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+
+from app.services.backends import backend_pool
+from app.services.circuit import get_breaker
+
+router = APIRouter()
+
+
+@router.get("")
+async def health():
+    """Cached health of external backends. Cheap to poll: never waits on a backend."""
+    backend_pool.refresh_health_soon()
+    acestep = await backend_pool.stats()
+    drawthings = get_breaker("drawthings").snapshot()
+    llm = get_breaker("llm").snapshot()
+    return {
+        "acestep": {
+            "available": any(b["circuit"] != "open" and b["healthy"] is not False for b in acestep),
+            "backends": acestep,
+        },
+        "drawthings": {"available": drawthings["state"] != "open", **drawthings},
+        "llm": {"available": llm["state"] != "open", **llm},
+    }
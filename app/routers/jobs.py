@@ -1,45 +1,299 @@
 import asyncio
 import json
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db, async_session
-from app.models import Job
+from app.database import get_db, async_session, write_lock
+from app.models import Job, Song
+from app.services import music as music_svc
+from app.services.job_queue import job_queue, request_client_id
+from app.services.job_events import job_events, job_snapshot, QUEUE_MOVED, TERMINAL
+from app.services.job_state import job_state
+from app.services.maintenance import maintenance
+from app.services.image import art_executor
 
 router = APIRouter()
 
+# Comment line sent on idle streams so proxies keep the connection open
+_KEEPALIVE_SECONDS = 15
+# Job ids accepted by one bulk snapshot or feed request
+_MAX_IDS = 200
+
+
+@router.get("/stats")
+async def job_stats():
+    """Queue wait per priority class, pending work, worker pools, event bus, state writer, maintenance, DB writes and art renders."""
+    return {
+        **await job_queue.stats(),
+        "events": job_events.stats(),
+        "state_writer": job_state.stats(),
+        "maintenance": maintenance.stats(),
+        "db_write_lock": write_lock.stats(),
+        "art_renders": art_executor.stats(),
+    }
+
+
+@router.get("")
+async def get_jobs(request: Request, ids: str | None = None, client: str | None = None,
+                   db: AsyncSession = Depends(get_db)):
+    """Snapshots of several jobs at once.
+
+    ?ids=a,b,c returns those jobs (unknown ids are left out); ?client=<id>
+    returns the active jobs of a client, with client=me meaning the caller.
+    """
+    job_ids, client_id = _feed_filter(request, ids, client)
+    return await _snapshots(db, job_ids, client_id)
+
+
+@router.get("/feed")
+async def job_feed(request: Request, ids: str | None = None, client: str | None = None):
+    """One SSE stream for many jobs: ?ids=a,b,c, or ?client=<id> for all jobs of a client.
+
+    Starts with a "snapshot" event ({"jobs": [...]}, as GET /api/jobs), then
+    sends "update" events ({"jobs": [...]}) holding only the fields that
+    changed, plus "id", for each job that changed since the last event. A
+    stream for explicit ids ends once all of them are finished; a client
+    stream stays open and picks up the client's new jobs. Reconnecting
+    starts over with a fresh snapshot.
+    """
+    job_ids, client_id = _feed_filter(request, ids, client)
+
+    def watched(job_id: str, data: dict) -> bool:
+        if job_ids is not None:
+            return job_id in job_ids
+        return data.get("client_id") == client_id
+
+    def done(sent: dict) -> bool:
+        return job_ids is not None and all(
+            job_id not in sent or sent[job_id]["status"] in TERMINAL for job_id in job_ids
+        )
+
+    async def event_generator():
+        queue = job_events.subscribe_all()
+        try:
+            async with async_session() as db:
+                snapshots = await _snapshots(db, job_ids, client_id)
+            sent = {data["id"]: data for data in snapshots}
+            seqs = {job_id: job_events.last_id(job_id) for job_id in sent}
+            yield _sse({"jobs": snapshots}, event="snapshot")
+            if done(sent):
+                return
+
+            while True:
+                try:
+                    items = [await asyncio.wait_for(queue.get(), _KEEPALIVE_SECONDS)]
+                except asyncio.TimeoutError:
+                    # Catch up on anything our queue dropped while it was full
+                    items = [
+                        (job_id, *latest) for job_id in sent
+                        if (latest := job_events.latest(job_id)) and latest[0] > seqs[job_id]
+                    ]
+                    if not items:
+                        yield ": keepalive\n\n"
+                        continue
+                # Everything already waiting goes out in the same event
+                while not queue.empty():
+                    items.append(queue.get_nowait())
+
+                changed: dict[str, dict] = {}
+                refresh_positions = False
+                for job_id, seq, data in items:
+                    if data == QUEUE_MOVED:
+                        refresh_positions = True
+                    elif watched(job_id, data) and seq > seqs.get(job_id, 0):
+                        seqs[job_id] = seq
+                        changed[job_id] = data
+                pending = [job_id for job_id, data in {**sent, **changed}.items() if data["status"] == "pending"]
+                if pending and (refresh_positions or any(d["status"] == "pending" for d in changed.values())):
+                    async with async_session() as db:
+                        jobs = (await db.execute(select(Job).where(Job.id.in_(pending)))).scalars().all()
+                        positions = await job_queue.positions(db, jobs)
+                    for job in jobs:
+                        data = changed.get(job.id) or sent[job.id]
+                        changed[job.id] = {**data, "queue_position": positions.get(job.id)}
+
+                deltas = []
+                for job_id, data in changed.items():
+                    delta = _delta(sent.get(job_id), data)
+                    sent[job_id] = data
+                    if delta:
+                        deltas.append(delta)
+                if deltas:
+                    yield _sse({"jobs": deltas}, event="update")
+                if done(sent):
+                    return
+        finally:
+            job_events.unsubscribe_all(queue)
+
+    return _event_stream(event_generator())
+
+
+def _feed_filter(request: Request, ids: str | None, client: str | None) -> tuple[set[str] | None, str | None]:
+    if ids:
+        job_ids = {i.strip() for i in ids.split(",") if i.strip()}
+        if len(job_ids) > _MAX_IDS:
+            raise HTTPException(400, f"At most {_MAX_IDS} job ids per request")
+        return job_ids, None
+    if client:
+        return None, request_client_id(request) if client == "me" else client
+    raise HTTPException(400, "ids or client is required")
+
+
+async def _snapshots(db: AsyncSession, job_ids: set[str] | None, client_id: str | None) -> list[dict]:
+    if job_ids is not None:
+        stmt = select(Job).where(Job.id.in_(job_ids))
+    else:
+        stmt = select(Job).where(Job.client_id == client_id, Job.status.in_(("pending", "running")))
+    jobs = (await db.execute(stmt.order_by(Job.created_at, Job.id))).scalars().all()
+    positions = await job_queue.positions(db, jobs)
+    snapshots = []
+    for job in jobs:
+        latest = job_events.latest(job.id)
+        if job.status not in TERMINAL and latest and latest[1]["status"] != "pending":
+            # Progress reaches the database in batches; the bus has the current state
+            snapshots.append(latest[1])
+        else:
+            snapshots.append(_job_dict(job, positions.get(job.id)))
+    return snapshots
+
+
+def _delta(previous: dict | None, data: dict) -> dict:
+    """Fields of data that differ from previous, with the job id; everything for a new job."""
+    if previous is None:
+        return data
+    changed = {k: v for k, v in data.items() if previous.get(k) != v}
+    return {"id": data["id"], **changed} if changed else {}
+
+
+@router.post("/maintenance")
+async def run_maintenance(vacuum: bool | None = None):
+    """Prune and trim old jobs and optimize the database now (vacuum=true forces VACUUM)."""
+    return await maintenance.run(vacuum)
+
 
 @router.get("/{job_id}")
 async def get_job(job_id: str, db: AsyncSession = Depends(get_db)):
     job = await db.get(Job, job_id)
     if not job:
         raise HTTPException(404, "Job not found")
-    return _job_dict(job)
+    return _job_dict(job, await job_queue.position(db, job))
+
+
+@router.delete("/{job_id}")
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str, db: AsyncSession = Depends(get_db)):
+    """Cancel a queued or running job.
+
+    Queued jobs are removed from the queue. Running jobs stop polling and
+    free their worker right away, and ACE-Step is asked to abort the task
+    where it supports that. Songs still waiting on the job are marked
+    cancelled.
+    """
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    if job.status in TERMINAL:
+        raise HTTPException(409, f"Job already {job.status}")
+
+    outcome = await job_queue.cancel(job_id)
+    if outcome is None:
+        raise HTTPException(409, "Job is not queued or running in this process")
+
+    backend_aborted = False
+    if outcome["backend_task_id"]:
+        backend_aborted = await music_svc.cancel_task(outcome["backend_task_id"])
+
+    await db.refresh(job)
+    for song_id in _job_song_ids(job):
+        song = await db.get(Song, song_id)
+        # Only songs still waiting on this job; a repaint's source song keeps its audio
+        if song and song.status == "generating":
+            song.status = "cancelled"
+    await db.commit()
+
+    return {**_job_dict(job), "was": outcome["was"], "backend_aborted": backend_aborted}
+
+
+def _job_song_ids(job: Job) -> list[int]:
+    ids = [job.song_id] if job.song_id else []
+    try:
+        payload = json.loads(job.payload_json or "{}")
+    except json.JSONDecodeError:
+        payload = {}
+    ids += [i for i in payload.get("song_ids", []) if i not in ids]
+    return ids
 
 
 @router.get("/{job_id}/stream")
-async def stream_job(job_id: str):
-    """SSE progress stream for a job."""
-    async def event_generator():
-        while True:
-            async with async_session() as db:
-                job = await db.get(Job, job_id)
-                if not job:
-                    yield _sse({"error": "Job not found"}, event="error")
-                    return
+async def stream_job(job_id: str, request: Request):
+    """SSE progress stream for a job, fed from the in-process event bus.
+
+    The database is read once for the initial snapshot (or when a
+    Last-Event-ID reconnect falls outside the bus's ring buffer or comes from
+    before a restart) and for queue positions while the job is pending.
+    """
+    # None for a fresh stream, or an id from before a restart
+    last_id = job_events.parse_event_id(request.headers.get("last-event-id"))
 
-                data = _job_dict(job)
-                yield _sse(data)
+    async def event_generator():
+        queue = job_events.subscribe(job_id)
+        try:
+            sent = 0
+            missed = job_events.since(job_id, last_id) if last_id is not None else None
+            if missed is None:
+                # Fresh stream, or resume point no longer buffered: start from the
+                # latest published state, or the database if nothing was published
+                latest = job_events.latest(job_id)
+                if latest is None or latest[1]["status"] == "pending":
+                    snapshot = await _snapshot(job_id)
+                    if snapshot is None:
+                        yield _sse({"error": "Job not found"}, event="error")
+                        return
+                    latest = (job_events.last_id(job_id), snapshot)
+                missed = [latest]
+            for seq, data in missed:
+                sent = seq
+                yield _sse(data, event_id=seq)
+            status = (missed[-1] if missed else job_events.latest(job_id))[1]["status"]
+            if status in TERMINAL:
+                return
 
-                if job.status in ("completed", "failed"):
+            while True:
+                try:
+                    seq, data = await asyncio.wait_for(queue.get(), _KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    latest = job_events.latest(job_id)
+                    if latest is None or latest[0] <= sent:
+                        yield ": keepalive\n\n"
+                        continue
+                    # Our queue overflowed at some point; catch up on the latest state
+                    seq, data = latest
+                if data == QUEUE_MOVED:
+                    if status == "pending":
+                        snapshot = await _snapshot(job_id)
+                        if snapshot:
+                            yield _sse(snapshot, event_id=sent)
+                    continue
+                if seq <= sent:
+                    continue
+                sent, status = seq, data["status"]
+                if status == "pending":
+                    data = await _snapshot(job_id) or data
+                yield _sse(data, event_id=seq)
+                if status in TERMINAL:
                     return
+        finally:
+            job_events.unsubscribe(job_id, queue)
+
+    return _event_stream(event_generator())
 
-            await asyncio.sleep(1)
 
+def _event_stream(generator) -> StreamingResponse:
     return StreamingResponse(
-        event_generator(),
+        generator,
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -49,18 +303,18 @@ async def stream_job(job_id: str):
     )
 
 
-def _sse(data: dict, event: str = "message") -> str:
-    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+async def _snapshot(job_id: str) -> dict | None:
+    async with async_session() as db:
+        job = await db.get(Job, job_id)
+        if not job:
+            return None
+        return _job_dict(job, await job_queue.position(db, job))
 
 
-def _job_dict(job: Job) -> dict:
-    return {
-        "id": job.id,
-        "job_type": job.job_type,
-        "status": job.status,
-        "progress": job.progress,
-        "stage": job.stage,
-        "result_json": job.result_json,
-        "error": job.error,
-        "song_id": job.song_id,
-    }
+def _sse(data: dict, event: str = "message", event_id: int | None = None) -> str:
+    head = f"id: {job_events.event_id(event_id)}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _job_dict(job: Job, queue_position: int | None = None) -> dict:
+    return job_snapshot(job, queue_position)
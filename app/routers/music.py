@@ -1,41 +1,51 @@
 import uuid
 import json
 
-from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db, async_session
 from app.models import Song, Job
-from app.config import AUDIO_DIR
+from app.config import AUDIO_DIR, JOB_WORKERS_MUSIC
 from app.services import music as music_svc
+from app.services import gen_cache, task_runner
+from app.services.job_state import job_state
+from app.services.job_queue import job_queue, Requeue, parse_priority, request_client_id
 
 router = APIRouter()
 
 
 @router.post("/generate")
-async def generate_music(body: dict, bg: BackgroundTasks, db: AsyncSession = Depends(get_db)):
+async def generate_music(body: dict, request: Request, db: AsyncSession = Depends(get_db)):
     """Direct music generation - submit arbitrary params to ACE-Step."""
     song_id = body.pop("song_id", None)
+    try:
+        priority = parse_priority(body.pop("priority", None), job_queue.default_priority("music_generate"))
+    except ValueError as e:
+        return {"error": str(e)}
 
     job = Job(
         id=str(uuid.uuid4()),
         job_type="music_generate",
-        status="pending",
         song_id=song_id,
     )
-    db.add(job)
-    await db.commit()
-
-    bg.add_task(_run_music_job, job.id, song_id, body)
+    await job_queue.enqueue(
+        db, job, {"song_id": song_id, "params": body},
+        priority=priority, client_id=request_client_id(request),
+    )
     return {"job_id": job.id}
 
 
 @router.post("/repaint")
-async def repaint_music(body: dict, bg: BackgroundTasks, db: AsyncSession = Depends(get_db)):
+async def repaint_music(body: dict, request: Request, db: AsyncSession = Depends(get_db)):
     """Repaint a section of an existing song."""
     song_id = body.get("song_id")
     if not song_id:
         return {"error": "song_id is required"}
+    try:
+        priority = parse_priority(body.get("priority"), job_queue.default_priority("music_repaint"))
+    except ValueError as e:
+        return {"error": str(e)}
 
     song = await db.get(Song, song_id)
     if not song or not song.audio_path:
@@ -55,66 +65,106 @@ async def repaint_music(body: dict, bg: BackgroundTasks, db: AsyncSession = Depe
     job = Job(
         id=str(uuid.uuid4()),
         job_type="music_repaint",
-        status="pending",
         song_id=song_id,
     )
-    db.add(job)
-    await db.commit()
-
-    bg.add_task(_run_music_job, job.id, song_id, ace_params)
+    await job_queue.enqueue(
+        db, job, {"song_id": song_id, "params": ace_params},
+        priority=priority, client_id=request_client_id(request),
+    )
     return {"job_id": job.id}
 
 
+@router.get("/pool")
+async def pool_stats():
+    """Connection pool statistics for the shared ACE-Step HTTP client."""
+    return music_svc.pool_stats()
+
+
+@router.get("/ref-cache")
+async def ref_cache_stats():
+    """Hit/miss statistics for the reference audio cache."""
+    from app.services.ref_audio import ref_audio_cache
+    return ref_audio_cache.stats()
+
+
+@router.get("/cache")
+async def generation_cache_stats():
+    """Size and hit/miss counters of the generation result cache."""
+    return await gen_cache.stats()
+
+
+@router.get("/queue")
+async def queue_stats():
+    """Worker pools and pending counts of the persistent job queue."""
+    return await job_queue.stats()
+
+
+@router.get("/poller")
+async def poller_stats():
+    """State of the shared batched ACE-Step poller."""
+    from app.services.poller import task_poller
+    return task_poller.stats()
+
+
 async def _run_music_job(job_id: str, song_id: int | None, params: dict):
     """Background: submit, poll, update job."""
     async with async_session() as db:
         job = await db.get(Job, job_id)
         try:
-            job.status = "running"
-            job.stage = "Submitting..."
-            await db.commit()
-
-            result = await music_svc.submit_task(params)
-            ace_task_id = result.get("task_id")
-            if not ace_task_id:
-                raise RuntimeError("No task_id from ACE-Step")
+            job_state.save(job, status="running", stage="Submitting...")
 
             async def on_progress(r):
                 parsed = r.get("result_parsed")
                 if isinstance(parsed, list) and parsed:
                     p = parsed[0]
-                    job.progress = float(p.get("progress", 0))
-                    job.stage = p.get("stage", r.get("progress_text", ""))
+                    job_state.save(
+                        job, progress=p.get("progress", 0),
+                        stage=p.get("stage", r.get("progress_text", "")), eta_seconds=r.get("eta_seconds"),
+                    )
                 else:
-                    job.stage = r.get("progress_text", "Processing...")
-                await db.commit()
+                    job_state.save(job, stage=r.get("progress_text", "Processing..."), eta_seconds=r.get("eta_seconds"))
 
-            final = await music_svc.poll_until_done(ace_task_id, on_progress=on_progress)
+            ace_task_id, final = await task_runner.run_task(db, job, params, on_progress=on_progress)
+            job_state.save(job, phase="downloading")
 
             parsed = final.get("result_parsed")
             if isinstance(parsed, list) and parsed:
                 audio_file = parsed[0].get("file")
                 if audio_file and song_id:
                     from pathlib import Path
-                    audio_bytes = await music_svc.download_audio(audio_file)
                     ext = Path(audio_file).suffix or ".mp3"
                     local_name = f"{song_id}_{uuid.uuid4().hex[:8]}{ext}"
                     local_path = AUDIO_DIR / local_name
-                    local_path.write_bytes(audio_bytes)
+                    parsed[0]["download"] = await music_svc.download_audio(
+                        audio_file, local_path, task_id=ace_task_id
+                    )
 
                     song = await db.get(Song, song_id)
                     if song:
                         song.audio_path = str(local_path)
                         song.status = "completed"
+                        song.seed = gen_cache.result_seed(parsed[0])
 
                 job.result_json = json.dumps(parsed[0])
 
             job.status = "completed"
             job.progress = 1.0
             job.stage = "Done"
-            await db.commit()
+            job.eta_seconds = None
+            await job_state.finish(db, job)
 
+        except Requeue:
+            raise
         except Exception as e:
             job.status = "failed"
             job.error = str(e)
-            await db.commit()
+            await job_state.finish(db, job)
+
+
+async def _music_job_handler(job_id: str, payload: dict):
+    await _run_music_job(job_id, payload.get("song_id"), payload["params"])
+
+
+job_queue.register("music_generate", _music_job_handler, pool="music", workers=JOB_WORKERS_MUSIC)
+# A repaint is a user waiting on an edit; it goes ahead of queued renders
+job_queue.register("music_repaint", _music_job_handler, pool="music", workers=JOB_WORKERS_MUSIC, priority="interactive")
@@ -87,6 +87,9 @@ async def delete_persona(persona_id: int, db: AsyncSession = Depends(get_db)):
         path = getattr(persona, path_attr)
         if path and Path(path).exists():
             Path(path).unlink(missing_ok=True)
+    if persona.ref_audio_path:
+        from app.services.ref_audio import ref_audio_cache
+        ref_audio_cache.forget_file(persona.ref_audio_path)
     await db.delete(persona)
     await db.commit()
     return {"ok": True}
@@ -1,29 +1,55 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, HTTPException
 
-from app.database import get_db, async_session
-from app.models import Setting
+from app.services.circuit import get_breaker
+from app.services.settings_cache import settings_cache
 
 router = APIRouter()
 
 
 @router.get("")
-async def get_settings(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Setting))
-    rows = result.scalars().all()
-    return {r.key: r.value for r in rows}
+async def get_settings():
+    return await settings_cache.all()
 
 
 @router.put("")
-async def update_settings(body: dict, db: AsyncSession = Depends(get_db)):
-    for key, value in body.items():
-        existing = await db.get(Setting, key)
-        if existing:
-            existing.value = str(value)
-        else:
-            db.add(Setting(key=key, value=str(value)))
-    await db.commit()
+async def update_settings(body: dict):
+    # Services that depend on a changed key are notified by the cache
+    await settings_cache.update(body)
+    return {"ok": True}
+
+
+@router.get("/backends")
+async def list_backends():
+    """ACE-Step backends with weight, cached health and outstanding tasks."""
+    from app.services.backends import backend_pool
+    await backend_pool.refresh_health()
+    return await backend_pool.stats()
+
+
+@router.post("/backends")
+async def add_backend(body: dict):
+    """Add an ACE-Step backend (or update its weight)."""
+    from app.services.backends import backend_pool
+    url = (body.get("url") or "").strip()
+    if not url.startswith(("http://", "https://")):
+        raise HTTPException(400, "url must start with http:// or https://")
+    try:
+        weight = float(body.get("weight", 1.0))
+    except (TypeError, ValueError):
+        raise HTTPException(400, "weight must be a number")
+    backend = await backend_pool.add(url, weight)
+    await backend_pool.refresh_health(force=True)
+    return backend.to_dict()
+
+
+@router.delete("/backends")
+async def remove_backend(url: str):
+    """Remove an ACE-Step backend. Tasks already running on it keep polling it."""
+    from app.services.backends import backend_pool
+    if len(await backend_pool.backends()) <= 1:
+        raise HTTPException(400, "Cannot remove the last backend")
+    if not await backend_pool.remove(url):
+        raise HTTPException(404, "Backend not found")
     return {"ok": True}
 
 
@@ -33,11 +59,7 @@ async def list_llm_models():
     try:
         from modulle import create_ai_client
 
-        async with async_session() as db:
-            settings = {}
-            for k in ["llm_provider", "llm_base_url", "llm_api_key"]:
-                row = await db.get(Setting, k)
-                settings[k] = row.value if row and row.value else ""
+        settings = await settings_cache.get_many(["llm_provider", "llm_base_url", "llm_api_key"])
 
         provider = settings.get("llm_provider") or "ollama"
         base_url = settings.get("llm_base_url") or "http://localhost:11434"
@@ -50,7 +72,8 @@ async def list_llm_models():
             kwargs["api_key"] = api_key
 
         client, _, _ = create_ai_client(provider=provider, **kwargs)
-        models = client.list_models()
+        with get_breaker("llm"):
+            models = client.list_models()
         return models if models else []
 
     except ImportError:
@@ -96,29 +119,27 @@ async def list_grpc_models():
     """List available models on the Draw Things gRPC server."""
     try:
         from app.config import GRPC_SERVER
-        from app.services.image import create_dt_client
-
-        async with async_session() as db:
-            row = await db.get(Setting, "grpc_server")
-            server = row.value if row and row.value else GRPC_SERVER
-
-        with create_dt_client(server) as client:
-            reply = client.echo("test")
-            models = []
-            loras = []
-            for f in sorted(reply.files):
-                cat = _categorise_file(f)
-                entry = {"file": f, "name": _readable_model_name(f)}
-                if cat == 'model':
-                    models.append(entry)
-                elif cat == 'lora':
-                    loras.append(entry)
-            return {
-                "connected": True,
-                "server": server,
-                "models": models,
-                "loras": loras,
-            }
+        from app.services.image import list_server_files
+
+        server = await settings_cache.get("grpc_server", GRPC_SERVER)
+
+        with get_breaker("drawthings"):
+            files = await list_server_files(server)
+        models = []
+        loras = []
+        for f in sorted(files):
+            cat = _categorise_file(f)
+            entry = {"file": f, "name": _readable_model_name(f)}
+            if cat == 'model':
+                models.append(entry)
+            elif cat == 'lora':
+                loras.append(entry)
+        return {
+            "connected": True,
+            "server": server,
+            "models": models,
+            "loras": loras,
+        }
 
     except Exception as e:
         return {"error": str(e)}
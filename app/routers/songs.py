@@ -1,15 +1,18 @@
+import base64
+from datetime import datetime
 from pathlib import Path
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import FileResponse
-from sqlalchemy import select, desc
+from fastapi.responses import FileResponse, JSONResponse
+from sqlalchemy import select, desc, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, joinedload, defer
 
 from app.database import get_db
 from app.models import Song, Persona
 from app.config import AUDIO_DIR, ART_DIR, EXPORTS_DIR
+from app.services import search
 
 router = APIRouter()
 
@@ -18,16 +21,74 @@ router = APIRouter()
 async def list_songs(
     q: str = "",
     offset: int = 0,
-    limit: int = Query(default=50, le=200),
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: str | None = None,
+    fields: str = Query(default="full", pattern="^(full|summary)$"),
+    persona: bool = False,
     db: AsyncSession = Depends(get_db),
 ):
-    stmt = select(Song).options(selectinload(Song.persona)).order_by(desc(Song.created_at))
-    if q:
-        stmt = stmt.where(Song.title.icontains(q) | Song.artist.icontains(q))
-    stmt = stmt.offset(offset).limit(limit)
-    result = await db.execute(stmt)
+    """Songs, newest first; with q, full-text matches ranked best first, each with a highlighted snippet.
+
+    Pages by cursor: pass the X-Next-Cursor header of one page to get the
+    next (offset still works, and is what search results use). fields=summary
+    skips lyrics and caption; persona=true adds persona_name.
+    """
+    summary = fields == "summary"
+    if q.strip():
+        matches = await search.search(db, q, offset, limit)
+        if matches is not None:
+            return JSONResponse(await _ranked_songs(db, matches, summary, persona))
+
+    stmt = _song_select(summary, persona).order_by(desc(Song.created_at), desc(Song.id))
+    if q.strip():
+        # No FTS5 in this SQLite build
+        stmt = stmt.where(
+            Song.title.icontains(q) | Song.artist.icontains(q) | Song.caption.icontains(q) | Song.lyrics.icontains(q)
+        )
+    if cursor:
+        created_at, song_id = _decode_cursor(cursor)
+        stmt = stmt.where(tuple_(Song.created_at, Song.id) < (created_at, song_id))
+    else:
+        stmt = stmt.offset(offset)
+    result = await db.execute(stmt.limit(limit))
     songs = result.scalars().all()
-    return [_song_dict(s) for s in songs]
+    headers = {}
+    if len(songs) == limit and songs[-1].created_at:
+        headers["X-Next-Cursor"] = _encode_cursor(songs[-1])
+    # Every value is already plain JSON; skip FastAPI's per-field encoding of up to 200 rows
+    return JSONResponse([_song_dict(s, summary, persona) for s in songs], headers=headers)
+
+
+async def _ranked_songs(db: AsyncSession, matches: list[dict], summary: bool, persona: bool) -> list[dict]:
+    result = await db.execute(_song_select(summary, persona).where(Song.id.in_([m["id"] for m in matches])))
+    songs = {s.id: s for s in result.scalars().all()}
+    return [
+        {**_song_dict(songs[m["id"]], summary, persona), "rank": m["rank"], "snippet": m["snippet"]}
+        for m in matches if m["id"] in songs
+    ]
+
+
+def _song_select(summary: bool, persona: bool):
+    stmt = select(Song)
+    if summary:
+        stmt = stmt.options(defer(Song.lyrics), defer(Song.caption))
+    if persona:
+        stmt = stmt.options(joinedload(Song.persona).load_only(Persona.name))
+    return stmt
+
+
+def _encode_cursor(song: Song) -> str:
+    raw = f"{song.created_at.isoformat()}|{song.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, song_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(song_id)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
 
 
 @router.get("/{song_id}")
@@ -41,6 +102,22 @@ async def get_song(song_id: int, db: AsyncSession = Depends(get_db)):
     return _song_dict(song)
 
 
+@router.get("/{song_id}/variations")
+async def list_variations(song_id: int, db: AsyncSession = Depends(get_db)):
+    """Sibling takes generated together with this song."""
+    song = await db.get(Song, song_id)
+    if not song:
+        raise HTTPException(404, "Song not found")
+    if not song.variation_group:
+        return []
+    result = await db.execute(
+        select(Song).options(selectinload(Song.persona))
+        .where(Song.variation_group == song.variation_group)
+        .order_by(Song.id)
+    )
+    return [_song_dict(s) for s in result.scalars().all()]
+
+
 @router.post("/{song_id}")
 async def update_song(song_id: int, body: dict, db: AsyncSession = Depends(get_db)):
     song = await db.get(Song, song_id)
@@ -108,13 +185,12 @@ async def download_export(song_id: int, db: AsyncSession = Depends(get_db)):
     return FileResponse(song.export_path, media_type="audio/mpeg", filename=filename)
 
 
-def _song_dict(s: Song) -> dict:
+def _song_dict(s: Song, summary: bool = False, persona: bool = True) -> dict:
+    """persona=True needs s.persona loaded; summary=True leaves out caption and lyrics."""
     d = {
         "id": s.id,
         "title": s.title,
         "artist": s.artist,
-        "caption": s.caption,
-        "lyrics": s.lyrics,
         "bpm": s.bpm,
         "key_scale": s.key_scale,
         "time_signature": s.time_signature,
@@ -128,8 +204,12 @@ def _song_dict(s: Song) -> dict:
         "persona_id": s.persona_id,
         "persona_name": None,
         "status": s.status,
+        "variation_group": s.variation_group,
         "created_at": s.created_at.isoformat() if s.created_at else None,
     }
-    if s.persona_id and s.persona:
+    if not summary:
+        d["caption"] = s.caption
+        d["lyrics"] = s.lyrics
+    if persona and s.persona_id and s.persona:
         d["persona_name"] = s.persona.name
     return d
@@ -0,0 +1,235 @@
+"""Pool of ACE-Step backends with cached health and least-outstanding routing.
+
+Backends come from the "acestep_backends" setting, a JSON list of
+{"url": ..., "weight": ...} objects. Without it the pool holds the single
+"acestep_url" setting (or ACESTEP_URL). New tasks go to the healthy backend
+with the fewest outstanding tasks relative to its weight. A task id stays
+pinned to the backend that accepted it so polling and downloads go back to
+the same process. Each backend has its own circuit breaker; backends with an
+open circuit are skipped, and if every circuit is open new work fails fast
+with CircuitOpenError.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from app.config import ACESTEP_URL, BACKEND_HEALTH_TTL
+from app.services.circuit import CircuitBreaker, CircuitOpenError, HALF_OPEN, get_breaker
+from app.services.settings_cache import settings_cache
+
+log = logging.getLogger(__name__)
+
+_SETTING_KEY = "acestep_backends"
+_MAX_PINS = 5000
+
+
+class Backend:
+    def __init__(self, url: str, weight: float = 1.0):
+        self.url = url.rstrip("/")
+        self.weight = max(0.01, float(weight))
+        self.healthy: bool | None = None  # None = not checked yet
+        self.checked_at = 0.0
+        self.outstanding = 0
+        self.submitted = 0
+
+    def load(self) -> float:
+        return self.outstanding / self.weight
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return get_breaker(f"acestep {self.url}")
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "circuit": self.breaker.state,
+            "outstanding": self.outstanding,
+            "submitted": self.submitted,
+        }
+
+
+class BackendPool:
+    def __init__(self):
+        self._backends: dict[str, Backend] = {}
+        self._pins: OrderedDict[str, str] = OrderedDict()  # task_id -> backend url
+        self._active: set[str] = set()  # pinned task ids still counted as outstanding
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+
+    async def _ensure_loaded(self):
+        if self._loaded:
+            return
+        async with self._lock:
+            if self._loaded:
+                return
+            configured = await self._read_setting()
+            fresh = {}
+            for entry in configured:
+                b = self._backends.get(entry["url"].rstrip("/")) or Backend(entry["url"])
+                b.weight = max(0.01, float(entry.get("weight", 1.0)))
+                fresh[b.url] = b
+            self._backends = fresh
+            self._loaded = True
+
+    async def _read_setting(self) -> list[dict]:
+        value = await settings_cache.get(_SETTING_KEY)
+        if value:
+            try:
+                entries = json.loads(value)
+                entries = [e for e in entries if isinstance(e, dict) and e.get("url")]
+                if entries:
+                    return entries
+            except (json.JSONDecodeError, TypeError):
+                log.warning("Ignoring malformed %s setting", _SETTING_KEY)
+        return [{"url": await settings_cache.get("acestep_url", ACESTEP_URL), "weight": 1.0}]
+
+    async def _write_setting(self, entries: list[dict]):
+        await settings_cache.update({_SETTING_KEY: json.dumps(entries)})
+
+    def invalidate(self):
+        """Reload the backend list from settings on next use."""
+        self._loaded = False
+
+    async def backends(self) -> list[Backend]:
+        await self._ensure_loaded()
+        return list(self._backends.values())
+
+    async def add(self, url: str, weight: float = 1.0) -> Backend:
+        await self._ensure_loaded()
+        backend = Backend(url, weight)
+        existing = self._backends.get(backend.url)
+        if existing:
+            existing.weight = backend.weight
+            backend = existing
+        else:
+            self._backends[backend.url] = backend
+        await self._write_setting([{"url": b.url, "weight": b.weight} for b in self._backends.values()])
+        return backend
+
+    async def remove(self, url: str) -> bool:
+        await self._ensure_loaded()
+        if self._backends.pop(url.rstrip("/"), None) is None:
+            return False
+        await self._write_setting([{"url": b.url, "weight": b.weight} for b in self._backends.values()])
+        return True
+
+    async def refresh_health(self, force: bool = False):
+        """Re-check backends whose cached health is older than BACKEND_HEALTH_TTL."""
+        from app.services import music as music_svc
+        now = time.monotonic()
+        stale = [b for b in await self.backends() if force or now - b.checked_at > BACKEND_HEALTH_TTL]
+        if not stale:
+            return
+        for b in stale:
+            b.checked_at = now  # don't stack up concurrent checks of the same backend
+        results = await asyncio.gather(*(music_svc.health_check(b.url) for b in stale))
+        for b, ok in zip(stale, results):
+            if b.healthy is not False and not ok:
+                log.warning("ACE-Step backend %s is unhealthy", b.url)
+            b.healthy = ok
+            b.checked_at = time.monotonic()
+            # The health probe doubles as the half-open trial call. It must
+            # not close an open circuit early, nor reset the failure count of
+            # a closed one: /health can be fine while task calls keep failing
+            if ok:
+                if b.breaker.state == HALF_OPEN and b.breaker.allows():
+                    b.breaker.record_success()
+            else:
+                b.breaker.record_failure("health check failed")
+
+    def refresh_health_soon(self):
+        """Refresh stale health in the background without waiting for it."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.refresh_health())
+
+    def mark_unhealthy(self, url: str):
+        b = self._backends.get(url)
+        if b:
+            b.healthy = False
+            b.checked_at = time.monotonic()
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        return get_breaker(f"acestep {url}")
+
+    async def choose(self) -> str:
+        """Pick the healthy backend with the least outstanding work per weight.
+
+        Raises CircuitOpenError when every backend's circuit is open.
+        """
+        await self.refresh_health()
+        backends = await self.backends()
+        available = [b for b in backends if b.breaker.allows()]
+        if not available:
+            retry = min(b.breaker.retry_in() for b in backends) if backends else 0
+            raise CircuitOpenError(f"All ACE-Step backends are unavailable (retry in {retry:.0f}s)")
+        healthy = [b for b in available if b.healthy is not False]
+        candidates = healthy or available
+        return min(candidates, key=lambda b: (b.load(), -b.weight)).url
+
+    async def acquire(self) -> str:
+        """Choose a backend for a new task and count it as outstanding."""
+        url = await self.choose()
+        b = self._backends.get(url)
+        if b:
+            b.outstanding += 1
+        return url
+
+    def release(self, url: str):
+        """Undo acquire() for a task that was never accepted."""
+        b = self._backends.get(url)
+        if b and b.outstanding > 0:
+            b.outstanding -= 1
+
+    def pin(self, task_id: str, url: str):
+        """Remember which backend accepted a task (acquired via acquire())."""
+        self._pins[task_id] = url
+        self._pins.move_to_end(task_id)
+        self._active.add(task_id)
+        b = self._backends.get(url)
+        if b:
+            b.submitted += 1
+        while len(self._pins) > _MAX_PINS:
+            self._pins.popitem(last=False)
+
+    def reattach(self, task_id: str, url: str | None):
+        """Pin a task accepted before a restart back to its backend and count it again."""
+        if task_id in self._active:
+            return
+        url = (url or self._pins.get(task_id) or "").rstrip("/")
+        if not url:
+            return
+        b = self._backends.get(url)
+        if b:
+            b.outstanding += 1
+        self._pins[task_id] = url
+        self._pins.move_to_end(task_id)
+        self._active.add(task_id)
+
+    def finish(self, task_id: str):
+        """A pinned task reached a terminal state; it no longer counts as outstanding."""
+        if task_id in self._active:
+            self._active.discard(task_id)
+            self.release(self._pins.get(task_id, ""))
+
+    async def url_for(self, task_id: str | None) -> str:
+        """Backend URL a task is pinned to, or the preferred backend otherwise."""
+        if task_id and task_id in self._pins:
+            return self._pins[task_id]
+        return await self.choose()
+
+    def pinned(self, task_id: str) -> str | None:
+        return self._pins.get(task_id)
+
+    async def stats(self) -> list[dict]:
+        return [b.to_dict() for b in await self.backends()]
+
+
+backend_pool = BackendPool()
+# Rebuild the backend list whenever its settings change
+settings_cache.subscribe(lambda changed: backend_pool.invalidate(), keys={_SETTING_KEY, "acestep_url"})
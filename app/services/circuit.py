@@ -0,0 +1,141 @@
+"""Circuit breakers for external backends (ACE-Step, Draw Things, LLM).
+
+A breaker starts closed. After CIRCUIT_FAILURE_THRESHOLD consecutive failures
+it opens and every call fails immediately with CircuitOpenError instead of
+waiting on timeouts. Once CIRCUIT_RESET_TIMEOUT has passed it goes half-open
+and lets a single trial call through: success closes it again, failure
+re-opens it.
+
+Use a breaker as a context manager around the call:
+
+    with get_breaker("drawthings"):
+        client.generate_image(...)
+"""
+
+import asyncio
+import logging
+import time
+
+import httpx
+
+from app.config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+
+log = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend whose circuit is open."""
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    """Whether an exception means the backend is down, as opposed to a bad request."""
+    if isinstance(exc, (CircuitOpenError, asyncio.CancelledError)):
+        return False
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    # Configuration problems are not the backend's fault
+    return not isinstance(exc, (ImportError, ValueError))
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error: str | None = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allows(self) -> bool:
+        """Whether a call may go through now (without claiming the trial slot)."""
+        state = self.state
+        return state == CLOSED or (state == HALF_OPEN and not self._trial_in_flight)
+
+    def before_call(self):
+        state = self.state
+        if state == OPEN or (state == HALF_OPEN and self._trial_in_flight):
+            raise CircuitOpenError(
+                f"{self.name} is unavailable (circuit open, retry in {self.retry_in():.0f}s)"
+                + (f": {self.last_error}" if self.last_error else "")
+            )
+        if state == HALF_OPEN:
+            self._trial_in_flight = True
+
+    def record_success(self):
+        if self._state != CLOSED:
+            log.info("Circuit %s closed", self.name)
+        self._state = CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self, exc: BaseException | str | None = None):
+        self.failures += 1
+        if exc is not None:
+            self.last_error = str(exc)[:300]
+        self._trial_in_flight = False
+        if self._state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self._state != OPEN:
+                log.warning("Circuit %s opened after %d failures: %s", self.name, self.failures, self.last_error)
+            self._state = OPEN
+            self.opened_at = time.monotonic()
+
+    def retry_in(self) -> float:
+        if self._state != OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def __enter__(self):
+        self.before_call()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is None:
+            self.record_success()
+        elif is_backend_failure(exc):
+            self.record_failure(exc)
+        else:
+            # The backend answered (e.g. a 4xx) or was never reached
+            self._trial_in_flight = False
+        return False
+
+    def snapshot(self) -> dict:
+        state = self.state
+        return {
+            "name": self.name,
+            "state": state,
+            "failures": self.failures,
+            "retry_in": round(self.retry_in(), 1),
+            "last_error": self.last_error,
+        }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def all_breakers() -> list[CircuitBreaker]:
+    return list(_breakers.values())
@@ -1,5 +1,6 @@
 """MP3 export with ID3 tags via ffmpeg + mutagen."""
 
+import asyncio
 import subprocess
 import shutil
 from pathlib import Path
@@ -28,6 +29,11 @@ async def export_mp3(
     Returns:
         Path to the exported MP3
     """
+    # ffmpeg and the tag rewrite block; keep them off the event loop
+    return await asyncio.to_thread(_export_mp3, audio_path, output_path, title, artist, lyrics, art_path)
+
+
+def _export_mp3(audio_path, output_path, title, artist, lyrics, art_path) -> str:
     audio_path = Path(audio_path)
     if not audio_path.exists():
         raise FileNotFoundError(f"Audio file not found: {audio_path}")
@@ -0,0 +1,143 @@
+"""Deterministic generation cache keyed on normalized ACE-Step params + seed.
+
+Opt-in per request ("use_cache"). A finished render is stored under the hash of
+its parameters and the seed ACE-Step actually used, so re-running the same
+request with that seed reuses the existing audio file instead of another GPU
+round trip. Entries are evicted least-recently-used beyond
+GENERATION_CACHE_MAX_ENTRIES; the audio files themselves belong to songs and
+are never deleted by the cache.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import select, func, delete
+
+from app.config import GENERATION_CACHE_MAX_ENTRIES
+from app.database import async_session
+from app.models import GenerationCache
+
+log = logging.getLogger(__name__)
+
+# Params that do not change the rendered audio
+_IGNORED_PARAMS = {"use_random_seed", "batch_size", "seed"}
+
+hits = 0
+misses = 0
+
+
+def result_seed(entry: dict) -> int | None:
+    """The seed ACE-Step used for a result entry, if it reports one."""
+    metas = entry.get("metas") or {}
+    for value in (entry.get("seed_value"), metas.get("seed"), entry.get("seed")):
+        if value is None or value == "":
+            continue
+        try:
+            return int(str(value).split(",")[0].strip())
+        except ValueError:
+            continue
+    return None
+
+
+def _normalize(value):
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in sorted(value.items())}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
+
+
+async def cache_key(ace_params: dict, seed: int | None) -> str | None:
+    """Hash of the render-relevant params plus seed. None without a seed."""
+    if seed is None:
+        return None
+    params = {k: v for k, v in ace_params.items() if k not in _IGNORED_PARAMS and v is not None}
+    ref = params.pop("reference_audio_path", None)
+    if ref:
+        # Key reference audio by content, not by path
+        from app.services.ref_audio import ref_audio_cache
+        path = Path(ref)
+        if not await asyncio.to_thread(path.exists):
+            return None
+        params["reference_audio_sha256"], _ = await ref_audio_cache.digest(path)
+    blob = json.dumps({"params": _normalize(params), "seed": int(seed)}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def requested_seed(ace_params: dict) -> int | None:
+    """The fixed seed a request asks for, or None when ACE-Step picks one."""
+    if ace_params.get("use_random_seed", True) or ace_params.get("seed") is None:
+        return None
+    try:
+        return int(ace_params["seed"])
+    except (TypeError, ValueError):
+        return None
+
+
+async def lookup(key: str | None) -> dict | None:
+    """Return {audio_path, seed, result} for a cached render, or None."""
+    global hits, misses
+    if key is None:
+        misses += 1
+        return None
+    async with async_session() as db:
+        entry = await db.get(GenerationCache, key)
+        if entry is None or not await asyncio.to_thread(Path(entry.audio_path).exists):
+            if entry is not None:
+                await db.delete(entry)
+                await db.commit()
+            misses += 1
+            return None
+        entry.hits += 1
+        entry.last_used_at = datetime.now(timezone.utc)
+        await db.commit()
+        hits += 1
+        return {
+            "audio_path": entry.audio_path,
+            "seed": entry.seed,
+            "result": json.loads(entry.result_json) if entry.result_json else {},
+        }
+
+
+async def store(key: str | None, audio_path: str, seed: int | None, result: dict):
+    if key is None:
+        return
+    async with async_session() as db:
+        entry = await db.get(GenerationCache, key)
+        if entry is None:
+            entry = GenerationCache(key=key)
+            db.add(entry)
+        entry.audio_path = audio_path
+        entry.seed = seed
+        entry.result_json = json.dumps(result)
+        entry.last_used_at = datetime.now(timezone.utc)
+        await db.flush()
+
+        count = await db.scalar(select(func.count()).select_from(GenerationCache))
+        excess = count - GENERATION_CACHE_MAX_ENTRIES
+        if excess > 0:
+            oldest = select(GenerationCache.key).order_by(GenerationCache.last_used_at).limit(excess)
+            await db.execute(delete(GenerationCache).where(GenerationCache.key.in_(oldest)))
+            log.info("Evicted %d generation cache entries", excess)
+        await db.commit()
+
+
+async def stats() -> dict:
+    async with async_session() as db:
+        count = await db.scalar(select(func.count()).select_from(GenerationCache))
+    total = hits + misses
+    return {
+        "entries": count,
+        "max_entries": GENERATION_CACHE_MAX_ENTRIES,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 3) if total else None,
+    }
@@ -0,0 +1,78 @@
+"""Long-lived, connection-pooled httpx client with pool statistics.
+
+One client is created in the app lifespan and shared by every request to a
+backend, so repeated polls reuse keep-alive connections instead of paying a
+new TCP handshake each time.
+"""
+
+import httpx
+
+from app.config import (
+    ACESTEP_MAX_CONNECTIONS,
+    ACESTEP_MAX_KEEPALIVE,
+    ACESTEP_KEEPALIVE_EXPIRY,
+    ACESTEP_CONNECT_TIMEOUT,
+    ACESTEP_READ_TIMEOUT,
+    ACESTEP_POOL_TIMEOUT,
+)
+
+
+class _CountingTransport(httpx.AsyncHTTPTransport):
+    """HTTP transport that counts requests and newly opened connections."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = 0
+        self.connections_opened = 0
+
+    async def _trace(self, event: str, info: dict):
+        if event == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        request.extensions = {**request.extensions, "trace": self._trace}
+        return await super().handle_async_request(request)
+
+    def stats(self) -> dict:
+        pool = self._pool
+        connections = list(pool.connections)
+        queued = [r for r in getattr(pool, "_requests", []) if r.is_queued()]
+        return {
+            "connections_open": sum(1 for c in connections if not c.is_closed()),
+            "connections_idle": sum(1 for c in connections if c.is_idle()),
+            "connections_opened": self.connections_opened,
+            "requests": self.requests,
+            "requests_reused": max(0, self.requests - self.connections_opened),
+            "requests_waiting": len(queued),
+        }
+
+
+def create_client(
+    max_connections: int = ACESTEP_MAX_CONNECTIONS,
+    max_keepalive: int = ACESTEP_MAX_KEEPALIVE,
+    keepalive_expiry: float = ACESTEP_KEEPALIVE_EXPIRY,
+) -> httpx.AsyncClient:
+    """Build a pooled AsyncClient. Per-call timeouts may still override the defaults."""
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=keepalive_expiry,
+    )
+    timeout = httpx.Timeout(
+        ACESTEP_READ_TIMEOUT,
+        connect=ACESTEP_CONNECT_TIMEOUT,
+        pool=ACESTEP_POOL_TIMEOUT,
+    )
+    transport = _CountingTransport(limits=limits)
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+
+def pool_stats(client: httpx.AsyncClient | None) -> dict:
+    """Report connection pool usage for a client created by create_client()."""
+    if client is None or client.is_closed:
+        return {"active": False}
+    transport = client._transport
+    if not isinstance(transport, _CountingTransport):
+        return {"active": True}
+    return {"active": True, **transport.stats()}
@@ -1,15 +1,26 @@
-"""Album art generation via DTgRPCconnector (Draw Things gRPC client)."""
+"""Album art generation via DTgRPCconnector (Draw Things gRPC client).
 
+The gRPC client is blocking: a render holds its thread for as long as Draw
+Things takes (30 s or more for FLUX), and decoding and saving the image is
+CPU work. All calls into it therefore run on art_executor, a small thread
+pool, so the event loop keeps serving requests, SSE streams and pollers.
+At most ART_RENDER_WORKERS renders run at once; further renders wait for a
+slot, and stats() reports how many are waiting.
+"""
+
+import asyncio
 import json
 import logging
 import ssl
 import socket
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from app.config import PRESETS_DIR, ART_DIR, DATA_DIR, GRPC_SERVER
-from app.database import async_session
-from app.models import Setting
+from app.config import PRESETS_DIR, ART_DIR, DATA_DIR, GRPC_SERVER, ART_RENDER_WORKERS
+from app.services.circuit import get_breaker
+from app.services.settings_cache import settings_cache
 
 log = logging.getLogger(__name__)
 
@@ -79,14 +90,82 @@ def create_dt_client(server: str):
     return DrawThingsClient(server)
 
 
+class ArtExecutor:
+    """Thread pool for blocking Draw Things calls, with a limit on concurrent renders."""
+
+    def __init__(self, renders: int = ART_RENDER_WORKERS):
+        self.renders = max(1, renders)
+        # One thread more than render slots, so quick calls never wait behind renders
+        self._pool = ThreadPoolExecutor(max_workers=self.renders + 1, thread_name_prefix="drawthings")
+        self._slots = asyncio.Semaphore(self.renders)
+        self.waiting = 0
+        self.running = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_seconds = 0.0
+        self.render_seconds = 0.0
+
+    async def render(self, fn, *args):
+        """Run a blocking render once a slot is free."""
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        queued = time.monotonic()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.monotonic()
+        self.wait_seconds += started - queued
+        self.running += 1
+        future = asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        future.add_done_callback(lambda f: self._render_done(f, started))
+        # A cancelled caller stops waiting, but the slot stays taken until the thread is done
+        return await asyncio.shield(future)
+
+    def _render_done(self, future: asyncio.Future, started: float):
+        self.running -= 1
+        self.render_seconds += time.monotonic() - started
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+        self._slots.release()
+
+    async def call(self, fn, *args):
+        """Run a short blocking call (echo, certificate fetch) without taking a render slot."""
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    def stats(self) -> dict:
+        done = self.completed + self.failed
+        return {
+            "render_workers": self.renders,
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_seconds": round(self.wait_seconds / done, 2) if done else None,
+            "avg_render_seconds": round(self.render_seconds / done, 2) if done else None,
+        }
+
+
+art_executor = ArtExecutor()
+
+
 async def _get_grpc_settings() -> dict:
-    async with async_session() as db:
-        result = {}
-        for k in ["grpc_server", "grpc_preset", "grpc_model",
-                   "grpc_negative_prompt", "grpc_width", "grpc_height"]:
-            row = await db.get(Setting, k)
-            result[k] = row.value if row and row.value else ""
-        return result
+    return await settings_cache.get_many(["grpc_server", "grpc_preset", "grpc_model",
+                                          "grpc_negative_prompt", "grpc_width", "grpc_height"])
+
+
+def _forget_server_cert(changed: dict):
+    """A different Draw Things server has a different certificate; fetch it again."""
+    if _CERT_PATH.exists():
+        _CERT_PATH.unlink()
+        log.info("Draw Things server changed; dropped cached TLS cert")
+
+
+settings_cache.subscribe(_forget_server_cert, keys={"grpc_server"})
 
 
 def _load_preset(name: str) -> dict | None:
@@ -200,19 +279,37 @@ async def generate_art(
 
     output_path = Path(output_path)
 
+    with get_breaker("drawthings"):
+        saved = await art_executor.render(_render, server, prompt, config, negative_prompt, output_path)
+    if saved:
+        return str(output_path)
+
+    raise RuntimeError("No images generated")
+
+
+def _render(server: str, prompt: str, config, negative_prompt: str, output_path: Path) -> bool:
+    """Blocking: render on Draw Things and save the first image as PNG. Runs on art_executor."""
     with create_dt_client(server) as client:
         images = client.generate_image(
             prompt=prompt,
             config=config,
             negative_prompt=negative_prompt,
         )
-        if images:
-            from tensor_decoder import tensor_to_pil
-            img = tensor_to_pil(images[0])
-            img.save(str(output_path), format="PNG")
-            return str(output_path)
+        if not images:
+            return False
+        from tensor_decoder import tensor_to_pil
+        img = tensor_to_pil(images[0])
+        img.save(str(output_path), format="PNG")
+        return True
 
-    raise RuntimeError("No images generated")
+
+async def list_server_files(server: str) -> list[str]:
+    """Files (models, LoRAs, ...) the Draw Things server reports, via its echo call."""
+    def echo():
+        with create_dt_client(server) as client:
+            return list(client.echo("test").files)
+
+    return await art_executor.call(echo)
 
 
 # Map sampler int from DT presets to scheduler name
@@ -0,0 +1,173 @@
+"""In-process broadcast bus for job progress.
+
+Whoever changes a job publishes its new state here (publish(job)); SSE
+streams subscribe per job and are fed from memory, so connected browser tabs
+no longer poll SQLite. Every event gets a per-job sequence number, sent as the
+SSE event id together with an epoch that is new for every process
+(event_id()). The last JOB_EVENT_BUFFER events of each job are kept in a ring
+buffer so a client reconnecting with Last-Event-ID gets exactly what it
+missed; if the buffer no longer covers it, or the id is from before a restart,
+the stream falls back to a snapshot from the database.
+
+subscribe_all() receives every job's events, for multiplexed feeds that
+watch many jobs (or all jobs of a client) over one connection.
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict, deque
+
+from app.models import Job
+
+log = logging.getLogger(__name__)
+
+JOB_EVENT_BUFFER = 50  # events kept per job for Last-Event-ID resume
+_MAX_JOBS = 500  # jobs with buffered events; least recently updated are dropped
+_SUBSCRIBER_QUEUE = 100
+_FEED_QUEUE = 1000  # subscribe_all() queues see every job's events
+
+TERMINAL = ("completed", "failed", "cancelled")
+
+# Put on pending jobs' subscriber queues when the queue moved
+QUEUE_MOVED = "queue_moved"
+
+
+def job_snapshot(job: Job, queue_position: int | None = None) -> dict:
+    return {
+        "id": job.id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "progress": job.progress,
+        "stage": job.stage,
+        "eta_seconds": job.eta_seconds,
+        "priority": job.priority,
+        "client_id": job.client_id,
+        "queue_position": queue_position,
+        "result_json": job.result_json,
+        "error": job.error,
+        "song_id": job.song_id,
+        "batch_id": job.batch_id,
+    }
+
+
+class _Channel:
+    def __init__(self):
+        self.seq = 0
+        self.events: deque[tuple[int, dict]] = deque(maxlen=JOB_EVENT_BUFFER)
+        self.subscribers: set[asyncio.Queue] = set()
+
+
+class JobEventBus:
+    def __init__(self):
+        self._channels: OrderedDict[str, _Channel] = OrderedDict()
+        self._feeds: set[asyncio.Queue] = set()
+        # Sequence numbers restart with the process; ids carry this to tell them apart
+        self.epoch = uuid.uuid4().hex[:8]
+        self.published = 0
+        self.dropped = 0
+
+    def _channel(self, job_id: str) -> _Channel:
+        channel = self._channels.get(job_id)
+        if channel is None:
+            channel = self._channels[job_id] = _Channel()
+        self._channels.move_to_end(job_id)
+        while len(self._channels) > _MAX_JOBS:
+            oldest_id, oldest = next(iter(self._channels.items()))
+            if oldest.subscribers:
+                # Still watched; keep it and stop trimming for now
+                break
+            del self._channels[oldest_id]
+        return channel
+
+    def publish(self, job: Job) -> int:
+        """Broadcast the job's current state; returns its event id."""
+        return self.publish_data(job.id, job_snapshot(job))
+
+    def publish_data(self, job_id: str, data: dict) -> int:
+        channel = self._channel(job_id)
+        channel.seq += 1
+        channel.events.append((channel.seq, data))
+        self.published += 1
+        for queue in list(channel.subscribers):
+            self._offer(queue, (channel.seq, data))
+        for queue in list(self._feeds):
+            self._offer(queue, (job_id, channel.seq, data))
+        return channel.seq
+
+    def queue_moved(self):
+        """Tell watchers of pending jobs that their queue position may have changed."""
+        for channel in self._channels.values():
+            if channel.subscribers and channel.events and channel.events[-1][1]["status"] == "pending":
+                for queue in list(channel.subscribers):
+                    self._offer(queue, (None, QUEUE_MOVED))
+        for queue in list(self._feeds):
+            self._offer(queue, (None, None, QUEUE_MOVED))
+
+    def _offer(self, queue: asyncio.Queue, item):
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # A stalled client; it will resync from the ring buffer or DB
+            self.dropped += 1
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=_SUBSCRIBER_QUEUE)
+        self._channel(job_id).subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        channel = self._channels.get(job_id)
+        if channel:
+            channel.subscribers.discard(queue)
+
+    def subscribe_all(self) -> asyncio.Queue:
+        """Queue of (job_id, event id, data) for every job; QUEUE_MOVED arrives as (None, None, QUEUE_MOVED)."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=_FEED_QUEUE)
+        self._feeds.add(queue)
+        return queue
+
+    def unsubscribe_all(self, queue: asyncio.Queue):
+        self._feeds.discard(queue)
+
+    def event_id(self, seq: int) -> str:
+        """SSE event id for a sequence number of this process."""
+        return f"{self.epoch}-{seq}"
+
+    def parse_event_id(self, value: str | None) -> int | None:
+        """Sequence number of a Last-Event-ID, or None if it is not from this process."""
+        epoch, _, seq = (value or "").partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def last_id(self, job_id: str) -> int:
+        channel = self._channels.get(job_id)
+        return channel.seq if channel else 0
+
+    def latest(self, job_id: str) -> tuple[int, dict] | None:
+        channel = self._channels.get(job_id)
+        return channel.events[-1] if channel and channel.events else None
+
+    def since(self, job_id: str, last_id: int) -> list[tuple[int, dict]] | None:
+        """Events after last_id, or None if the buffer no longer covers that point."""
+        channel = self._channels.get(job_id)
+        if channel is None or not channel.events or last_id > channel.seq:
+            return None
+        if last_id == channel.seq:
+            return []
+        if not channel.events or channel.events[0][0] > last_id + 1:
+            return None
+        return [(seq, data) for seq, data in channel.events if seq > last_id]
+
+    def stats(self) -> dict:
+        return {
+            "jobs": len(self._channels),
+            "subscribers": sum(len(c.subscribers) for c in self._channels.values()),
+            "feeds": len(self._feeds),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+job_events = JobEventBus()
@@ -0,0 +1,629 @@
+"""Durable job queue backed by the jobs table.
+
+Endpoints store a Job with status "pending" and its handler arguments in
+payload_json (enqueue()). Each worker pool runs a fixed number of async
+workers that claim pending jobs of their job types with a conditional UPDATE,
+so a job is only ever run by one worker, and pass the payload to the handler
+registered for that job type. A burst of submissions therefore reaches
+ACE-Step at most JOB_WORKERS_MUSIC at a time.
+
+Scheduling: the highest priority class with pending work goes first
+(interactive > normal > batch). Within a class, clients take turns: the
+client with the fewest running jobs, then the one served longest ago, gets
+its oldest job next, so one client's 50-song batch cannot starve another's.
+When higher-priority work arrives and no worker is free, a lower-priority
+job that is not rendering yet is pre-empted and goes back to the queue:
+either one claimed but not yet handed to ACE-Step (handlers call checkpoint()
+right before submitting), or, more usefully, one whose task is still waiting
+in ACE-Step's own queue (task_runner reports rendering() once ACE-Step shows
+progress). The latter's task is cancelled on the backend before its handler
+is. Pipeline jobs are not pre-empted themselves; their renders run as music
+jobs at the pipeline's priority and are.
+
+Queued work survives restarts: jobs that were running when the process stopped
+are put back in the queue on startup, and those with an ACE-Step task already
+in flight are claimed first within their priority class so their handlers
+re-attach to it (task_runner). A handler that raises Requeue (e.g. because
+every ACE-Step circuit is open) returns its job to its original place in the
+queue and the pool backs off before claiming again.
+
+cancel() removes a pending job from the queue, or cancels a running job's
+handler so its worker, poller watch and backend slot are freed at once.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+from sqlalchemy import select, update, func, and_, or_
+
+from app.config import QUEUE_IDLE_POLL, QUEUE_RETRY_DELAY
+from app.database import async_session
+from app.models import Job
+from app.services.job_events import job_events, job_snapshot, QUEUE_MOVED, TERMINAL
+from app.services.job_state import job_state
+
+log = logging.getLogger(__name__)
+
+Handler = Callable[[str, dict], Awaitable[None]]
+
+# Priority classes, highest first when claiming
+PRIORITIES = {"interactive": 2, "normal": 1, "batch": 0}
+_PRIORITY_NAMES = {v: k for k, v in PRIORITIES.items()}
+
+# Queue waits kept per priority class for stats()
+_WAIT_SAMPLES = 500
+
+
+class Requeue(Exception):
+    """Raised by a handler to put its job back in the queue."""
+
+    def __init__(self, reason: str, delay: float = QUEUE_RETRY_DELAY):
+        super().__init__(reason)
+        self.delay = delay
+
+
+class Preempted(Requeue):
+    """Raised by checkpoint() when higher-priority work needs the worker."""
+
+    def __init__(self):
+        super().__init__("pre-empted by higher-priority work", delay=0)
+
+
+def parse_priority(value, default: int) -> int:
+    """Priority class from a request value ("batch", "normal", "interactive" or 0-2)."""
+    if value is None or value == "":
+        return default
+    if isinstance(value, str) and value.lower() in PRIORITIES:
+        return PRIORITIES[value.lower()]
+    try:
+        return min(max(int(value), min(PRIORITIES.values())), max(PRIORITIES.values()))
+    except (TypeError, ValueError):
+        raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+
+
+def request_client_id(request) -> str:
+    """Fair-share identity of a request: X-Client-Id, else the client address."""
+    client_id = request.headers.get("x-client-id", "").strip()
+    if client_id:
+        return client_id[:64]
+    return request.client.host if request.client else "unknown"
+
+
+class _Running:
+    def __init__(self, client_id: str | None, priority: int):
+        self.client_id = client_id
+        self.priority = priority
+        self.submitted = False
+        self.rendering = False  # ACE-Step has started on the task
+        self.preempt = False
+        self.cancelled = False
+        self.task: asyncio.Task | None = None
+        self.backend_task_id: str | None = None
+
+
+class _Pool:
+    def __init__(self, name: str, workers: int, preemptible: bool = True):
+        self.name = name
+        self.workers = max(1, workers)
+        self.preemptible = preemptible
+        self.job_types: set[str] = set()
+        self.wake = asyncio.Event()
+        self.running: dict[str, _Running] = {}
+        self.last_served: dict[str | None, float] = {}  # client_id -> monotonic
+        self.paused_until = 0.0  # monotonic; set when a job is requeued
+
+    def running_for(self, client_id: str | None) -> int:
+        return sum(1 for r in self.running.values() if r.client_id == client_id)
+
+
+class JobQueue:
+    def __init__(self):
+        self._handlers: dict[str, Handler] = {}
+        self._default_priority: dict[str, int] = {}
+        self._pools: dict[str, _Pool] = {}
+        self._pool_of: dict[str, _Pool] = {}  # job_type -> pool
+        self._tasks: list[asyncio.Task] = []
+        self._waits: dict[int, deque[float]] = {p: deque(maxlen=_WAIT_SAMPLES) for p in PRIORITIES.values()}
+        self.finished = 0
+        self.crashed = 0
+        self.requeued = 0
+        self.preempted = 0
+        self.cancelled = 0
+
+    def register(
+        self,
+        job_types: str | tuple[str, ...],
+        handler: Handler,
+        pool: str = "default",
+        workers: int = 1,
+        priority: str = "normal",
+        preemptible: bool = True,
+    ):
+        """Run jobs of the given type(s) with handler(job_id, payload) in a worker pool.
+
+        Jobs in a pool registered with preemptible=False are never pre-empted.
+        """
+        if isinstance(job_types, str):
+            job_types = (job_types,)
+        p = self._pools.get(pool)
+        if p is None:
+            p = self._pools[pool] = _Pool(pool, workers, preemptible)
+        for job_type in job_types:
+            self._handlers[job_type] = handler
+            self._default_priority[job_type] = PRIORITIES[priority]
+            self._pool_of[job_type] = p
+            p.job_types.add(job_type)
+
+    def default_priority(self, job_type: str) -> int:
+        return self._default_priority.get(job_type, PRIORITIES["normal"])
+
+    async def enqueue(
+        self, db, job: Job, payload: dict, priority: int | None = None, client_id: str | None = None,
+    ) -> Job:
+        """Store a job with its payload and wake a worker for it."""
+        await self.enqueue_many(db, [(job, payload)], priority=priority, client_id=client_id)
+        return job
+
+    async def enqueue_many(
+        self, db, items: list[tuple[Job, dict]], priority: int | None = None, client_id: str | None = None,
+    ):
+        """enqueue() for several (job, payload) pairs, committed in one transaction."""
+        for job, payload in items:
+            if job.job_type not in self._handlers:
+                raise ValueError(f"No handler registered for job type {job.job_type!r}")
+        for job, payload in items:
+            job.status = "pending"
+            job.stage = "Queued"
+            job.payload_json = json.dumps(payload)
+            job.priority = self.default_priority(job.job_type) if priority is None else priority
+            job.client_id = client_id
+            db.add(job)
+        await db.commit()
+        for job, _ in items:
+            job_events.publish(job)
+            pool = self._pool_of[job.job_type]
+            self._maybe_preempt(pool, job.priority)
+            pool.wake.set()
+
+    def _maybe_preempt(self, pool: _Pool, priority: int):
+        """Free a worker for new work if all are busy and one holds lower-priority work not rendering yet."""
+        if not pool.preemptible or len(pool.running) < pool.workers:
+            return
+        from app.services import music as music_svc
+        victims = []
+        for job_id, r in pool.running.items():
+            if r.priority >= priority or r.preempt or r.cancelled:
+                continue
+            if not r.submitted:
+                victims.append((r.priority, 0, job_id))
+            elif r.backend_task_id and not r.rendering and music_svc.can_cancel(r.backend_task_id):
+                # Queued inside ACE-Step: nothing lost by taking it back
+                victims.append((r.priority, 1, job_id))
+        if not victims:
+            return
+        _, queued_in_backend, job_id = min(victims)
+        running = pool.running[job_id]
+        running.preempt = True
+        if queued_in_backend and running.task is not None:
+            running.task.cancel()
+        log.info("Pre-empting job %s for priority %s work", job_id, _PRIORITY_NAMES.get(priority, priority))
+
+    def checkpoint(self, job_id: str):
+        """Called by a handler right before it submits to ACE-Step.
+
+        Raises Preempted if higher-priority work claimed this worker; after
+        that the job counts as submitted and is no longer pre-empted.
+        """
+        running = self._running(job_id)
+        if running is None:
+            return
+        if running.preempt:
+            raise Preempted()
+        running.submitted = True
+
+    def submitted(self, job_id: str, backend_task_id: str):
+        """Record the backend task a running job is waiting on, for cancel().
+
+        Also used when a handler re-attaches to a task after a restart, so the
+        job counts as submitted either way.
+        """
+        running = self._running(job_id)
+        if running:
+            running.submitted = True
+            running.backend_task_id = backend_task_id
+
+    def rendering(self, job_id: str):
+        """Record that ACE-Step has started on the job's task; it is no longer pre-empted."""
+        running = self._running(job_id)
+        if running:
+            running.rendering = True
+
+    def is_cancelling(self, job_id: str) -> bool:
+        """Whether a running job's handler is being cancelled by cancel(), as opposed to a shutdown."""
+        running = self._running(job_id)
+        return running is not None and running.cancelled
+
+    def _running(self, job_id: str) -> _Running | None:
+        for pool in self._pools.values():
+            if job_id in pool.running:
+                return pool.running[job_id]
+        return None
+
+    async def cancel(self, job_id: str) -> dict | None:
+        """Cancel a pending or running job.
+
+        A pending job is marked cancelled in place. A running job's handler
+        is cancelled (which stops its polling and frees its backend slot) and
+        its worker moves on to the next job. Returns {"was": "pending" |
+        "running", "backend_task_id": ...}, or None if the job is not pending
+        or running in this process.
+        """
+        job_state.discard(job_id)
+        async with async_session() as db:
+            result = await db.execute(
+                update(Job).where(Job.id == job_id, Job.status == "pending")
+                .values(status="cancelled", stage="Cancelled", eta_seconds=None)
+            )
+            await db.commit()
+            if result.rowcount:
+                self.cancelled += 1
+                job_events.publish(await db.get(Job, job_id))
+                job_events.queue_moved()
+                return {"was": "pending", "backend_task_id": None}
+
+        running = self._running(job_id)
+        if running is None or running.task is None:
+            return None
+        running.cancelled = True
+        running.task.cancel()
+        await asyncio.wait({running.task}, timeout=10)
+        job_state.discard(job_id)
+        async with async_session() as db:
+            await db.execute(
+                update(Job).where(Job.id == job_id, Job.status.not_in(TERMINAL))
+                .values(status="cancelled", stage="Cancelled", eta_seconds=None)
+            )
+            await db.commit()
+            job_events.publish(await db.get(Job, job_id))
+        self.cancelled += 1
+        return {"was": "running", "backend_task_id": running.backend_task_id}
+
+    async def position(self, db, job: Job) -> int | None:
+        """Approximate 1-based place of a pending job in its pool's queue, None otherwise.
+
+        Counts pending jobs of a higher priority class, or the same class and
+        older; fair-share turns between clients can move a job up.
+        """
+        pool = self._pool_of.get(job.job_type)
+        if job.status != "pending" or pool is None:
+            return None
+        priority = job.priority if job.priority is not None else PRIORITIES["normal"]
+        ahead = await db.scalar(
+            select(func.count()).select_from(Job).where(
+                Job.status == "pending",
+                Job.job_type.in_(pool.job_types),
+                or_(
+                    Job.priority > priority,
+                    and_(
+                        Job.priority == priority,
+                        or_(
+                            Job.created_at < job.created_at,
+                            and_(Job.created_at == job.created_at, Job.id < job.id),
+                        ),
+                    ),
+                ),
+            )
+        )
+        return ahead + 1
+
+    async def positions(self, db, jobs) -> dict[str, int]:
+        """position() for many jobs with one query per pool; only pending jobs are included."""
+        pools = {}
+        for job in jobs:
+            pool = self._pool_of.get(job.job_type)
+            if job.status == "pending" and pool is not None:
+                pools.setdefault(pool.name, (pool, []))[1].append(job.id)
+        result = {}
+        for pool, wanted in pools.values():
+            rows = (await db.execute(
+                select(Job.id)
+                .where(Job.status == "pending", Job.job_type.in_(pool.job_types))
+                .order_by(Job.priority.desc(), Job.created_at, Job.id)
+            )).scalars().all()
+            rank = {job_id: i + 1 for i, job_id in enumerate(rows)}
+            result.update((job_id, rank[job_id]) for job_id in wanted if job_id in rank)
+        return result
+
+    async def wait(self, job_id: str, on_update=None, recheck: float = 30.0) -> dict:
+        """Wait for a job to finish and return its final snapshot.
+
+        on_update(snapshot) sees the states the job goes through, with its
+        queue position while pending. Event bus updates are used as they come;
+        the database is re-read for positions and every recheck seconds in
+        case an update was missed.
+        """
+        events = job_events.subscribe(job_id)
+        try:
+            while True:
+                async with async_session() as db:
+                    job = await db.get(Job, job_id)
+                    if job is None:
+                        raise LookupError(f"Job {job_id} not found")
+                    snapshot = job_snapshot(job, await self.position(db, job))
+                if snapshot["status"] in TERMINAL:
+                    return snapshot
+                if on_update:
+                    on_update(snapshot)
+                while True:
+                    try:
+                        _, data = await asyncio.wait_for(events.get(), recheck)
+                    except asyncio.TimeoutError:
+                        break
+                    if data == QUEUE_MOVED or data["status"] == "pending":
+                        break
+                    if data["status"] in TERMINAL:
+                        return data
+                    if on_update:
+                        on_update(data)
+        finally:
+            job_events.unsubscribe(job_id, events)
+
+    async def start(self):
+        """Recover interrupted jobs and start the workers."""
+        if self._tasks:
+            return
+        await self._recover()
+        for pool in self._pools.values():
+            for n in range(pool.workers):
+                self._tasks.append(asyncio.create_task(self._worker(pool), name=f"{pool.name}-worker-{n}"))
+            pool.wake.set()
+        log.info("Job queue started: %s", ", ".join(f"{p.name}={p.workers}" for p in self._pools.values()))
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _recover(self):
+        async with async_session() as db:
+            resumable = await db.scalar(
+                select(func.count()).select_from(Job)
+                .where(Job.status == "running", Job.payload_json.is_not(None), Job.backend_task_id.is_not(None))
+            )
+            requeued = await db.execute(
+                update(Job)
+                .where(Job.status == "running", Job.payload_json.is_not(None))
+                .values(status="pending", stage="Queued (restarted)", progress=0.0, eta_seconds=None)
+            )
+            # Jobs from before the queue existed cannot be re-run
+            orphaned = await db.execute(
+                update(Job)
+                .where(Job.status.in_(("pending", "running")), Job.payload_json.is_(None))
+                .values(status="failed", error="Interrupted by a restart")
+            )
+            await db.commit()
+        if requeued.rowcount or orphaned.rowcount:
+            log.info("Requeued %d interrupted jobs (%d to re-attach to ACE-Step), failed %d without a payload",
+                     requeued.rowcount, resumable, orphaned.rowcount)
+
+    def _pick_client(self, pool: _Pool, clients: list) -> str | None:
+        """Fair share: fewest running jobs, then longest since last served, then oldest job."""
+        return min(
+            clients,
+            key=lambda c: (pool.running_for(c.client_id), pool.last_served.get(c.client_id, 0.0), c.oldest),
+        ).client_id
+
+    async def _claim(self, pool: _Pool) -> tuple[str, str, dict] | None:
+        """Atomically move the next pending job of the pool to running."""
+        pending = and_(Job.status == "pending", Job.job_type.in_(pool.job_types))
+        columns = (Job.id, Job.job_type, Job.payload_json, Job.created_at, Job.started_at,
+                   Job.priority, Job.client_id)
+        async with async_session() as db:
+            while True:
+                top = await db.scalar(select(func.max(Job.priority)).where(pending))
+                if top is None:
+                    return None
+                # Jobs whose ACE-Step task survived a restart or a requeue are
+                # already using the GPU; re-attach to them before starting
+                # anything new of the same class
+                row = (await db.execute(
+                    select(*columns)
+                    .where(pending, Job.priority == top, Job.backend_task_id.is_not(None))
+                    .order_by(Job.created_at, Job.id)
+                    .limit(1)
+                )).first()
+                if row is None:
+                    clients = (await db.execute(
+                        select(Job.client_id, func.min(Job.created_at).label("oldest"))
+                        .where(pending, Job.priority == top)
+                        .group_by(Job.client_id)
+                    )).all()
+                    if not clients:
+                        continue
+                    client_id = self._pick_client(pool, clients)
+                    row = (await db.execute(
+                        select(*columns)
+                        .where(
+                            pending, Job.priority == top,
+                            Job.client_id.is_(None) if client_id is None else Job.client_id == client_id,
+                        )
+                        .order_by(Job.created_at, Job.id)
+                        .limit(1)
+                    )).first()
+                    if row is None:
+                        continue
+                top, client_id = row.priority, row.client_id
+                claimed = await db.execute(
+                    update(Job)
+                    .where(Job.id == row.id, Job.status == "pending")
+                    # Keep the first start across requeues, pre-emption and restarts
+                    .values(status="running", stage="Starting...",
+                            started_at=func.coalesce(Job.started_at, datetime.now(timezone.utc)))
+                )
+                await db.commit()
+                if claimed.rowcount != 1:
+                    continue  # Another worker got there first
+                # Register before the next await so concurrent claims see it
+                pool.running[row.id] = _Running(client_id, top)
+                pool.last_served[client_id] = time.monotonic()
+                if row.started_at is None:
+                    self._record_wait(top, row.created_at)
+                job_events.publish(await db.get(Job, row.id))
+                job_events.queue_moved()
+                return row.id, row.job_type, json.loads(row.payload_json or "{}")
+
+    def _record_wait(self, priority: int, created_at: datetime):
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        waited = (datetime.now(timezone.utc) - created_at).total_seconds()
+        self._waits.setdefault(priority, deque(maxlen=_WAIT_SAMPLES)).append(max(0.0, waited))
+
+    async def _worker(self, pool: _Pool):
+        while True:
+            pause = pool.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            pool.wake.clear()
+            try:
+                claimed = await self._claim(pool)
+            except Exception:
+                log.exception("Job queue claim failed (%s)", pool.name)
+                claimed = None
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(pool.wake.wait(), QUEUE_IDLE_POLL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # Another job may be waiting; let an idle worker look for it
+            pool.wake.set()
+
+            job_id, job_type, payload = claimed
+            running = pool.running[job_id]
+            running.task = asyncio.create_task(self._handlers[job_type](job_id, payload))
+            try:
+                await running.task
+                self.finished += 1
+            except asyncio.CancelledError:
+                if running.cancelled:
+                    log.info("Job %s cancelled", job_id)
+                elif running.preempt and not asyncio.current_task().cancelling():
+                    self.preempted += 1
+                    log.info("Job %s pre-empted while queued in ACE-Step", job_id)
+                    await self._withdraw(job_id, running.backend_task_id)
+                else:
+                    raise  # the worker itself is shutting down
+            except Preempted as e:
+                self.preempted += 1
+                log.info("Job %s %s", job_id, e)
+                await self._set_pending(job_id, "Queued (pre-empted)")
+            except Requeue as e:
+                self.requeued += 1
+                log.info("Requeued job %s: %s", job_id, e)
+                await self._set_pending(job_id, f"Queued ({e})")
+                # Hold the whole pool back, not just this worker
+                pool.paused_until = max(pool.paused_until, time.monotonic() + e.delay)
+            except Exception as e:
+                self.crashed += 1
+                log.exception("Job %s (%s) crashed", job_id, job_type)
+                await self._set_failed(job_id, str(e))
+            finally:
+                pool.running.pop(job_id, None)
+
+    async def _set_pending(self, job_id: str, stage: str):
+        job_state.discard(job_id)
+        async with async_session() as db:
+            await db.execute(
+                update(Job).where(Job.id == job_id)
+                .values(status="pending", stage=stage[:128], progress=0.0, eta_seconds=None)
+            )
+            await db.commit()
+            job_events.publish(await db.get(Job, job_id))
+
+    async def _withdraw(self, job_id: str, backend_task_id: str | None):
+        """Put a pre-empted job back in the queue, cancelling its task on the backend.
+
+        If the backend does not take the cancel, the job keeps its task and
+        re-attaches to it when next claimed.
+        """
+        from app.services import music as music_svc
+        values = {"status": "pending", "stage": "Queued (pre-empted)", "progress": 0.0, "eta_seconds": None}
+        if backend_task_id and await music_svc.cancel_task(backend_task_id):
+            values.update(backend_task_id=None, backend_url=None, phase="queued")
+        job_state.discard(job_id)
+        async with async_session() as db:
+            await db.execute(update(Job).where(Job.id == job_id, Job.status.not_in(TERMINAL)).values(**values))
+            await db.commit()
+            job_events.publish(await db.get(Job, job_id))
+
+    async def _set_failed(self, job_id: str, error: str):
+        job_state.discard(job_id)
+        async with async_session() as db:
+            await db.execute(
+                update(Job).where(Job.id == job_id, Job.status.not_in(TERMINAL))
+                .values(status="failed", error=error)
+            )
+            await db.commit()
+            job = await db.get(Job, job_id)
+            if job:
+                job_events.publish(job)
+
+    def wait_stats(self) -> dict:
+        """Queue wait (creation to first claim) per priority class, in seconds."""
+        out = {}
+        for priority, samples in sorted(self._waits.items(), reverse=True):
+            ordered = sorted(samples)
+            n = len(ordered)
+            out[_PRIORITY_NAMES.get(priority, str(priority))] = {
+                "samples": n,
+                "mean": round(sum(ordered) / n, 2) if n else None,
+                "p50": round(ordered[n // 2], 2) if n else None,
+                "p95": round(ordered[min(n - 1, int(n * 0.95))], 2) if n else None,
+                "max": round(ordered[-1], 2) if n else None,
+            }
+        return out
+
+    async def stats(self) -> dict:
+        async with async_session() as db:
+            rows = (await db.execute(
+                select(Job.job_type, Job.priority, func.count())
+                .where(Job.status == "pending")
+                .group_by(Job.job_type, Job.priority)
+            )).all()
+        pools = {}
+        for p in self._pools.values():
+            pending = {}
+            for job_type, priority, count in rows:
+                if job_type in p.job_types:
+                    name = _PRIORITY_NAMES.get(priority, str(priority))
+                    pending[name] = pending.get(name, 0) + count
+            pools[p.name] = {
+                "workers": p.workers,
+                "job_types": sorted(p.job_types),
+                "running": len(p.running),
+                "running_by_client": {
+                    str(c): p.running_for(c) for c in {r.client_id for r in p.running.values()}
+                },
+                "paused_for": round(max(0.0, p.paused_until - time.monotonic()), 1),
+                "pending": sum(pending.values()),
+                "pending_by_priority": pending,
+            }
+        return {
+            "pools": pools,
+            "wait_seconds": self.wait_stats(),
+            "finished": self.finished,
+            "crashed": self.crashed,
+            "requeued": self.requeued,
+            "preempted": self.preempted,
+            "cancelled": self.cancelled,
+        }
+
+
+job_queue = JobQueue()
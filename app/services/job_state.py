@@ -0,0 +1,147 @@
+"""Coalesced writer for in-flight job state (progress, stage, ETA, phase).
+
+Job handlers report progress on every ACE-Step poll. Committing each report
+would turn many concurrent jobs into a steady stream of small SQLite write
+transactions. Instead, save(job, **fields) updates the in-memory Job (without
+marking it dirty in the handler's session), publishes the new state to the
+event bus right away, and queues only the fields that actually changed.
+Reports that change nothing are dropped. Every JOB_STATE_FLUSH_INTERVAL
+seconds the queued changes of all jobs are written in a single transaction.
+
+Terminal states do not go through the queue: handlers commit them with
+finish(db, job), together with their songs, which writes the job's full
+state at once and drops any queued change for it. Flushes never touch a job
+that is already finished, or one the job queue has put back in the queue
+after the changes were queued (requeue, pre-emption).
+"""
+
+import asyncio
+import logging
+
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import flag_modified, set_committed_value
+
+from app.config import JOB_STATE_FLUSH_INTERVAL
+from app.database import async_session
+from app.models import Job
+from app.services.job_events import job_events, TERMINAL
+
+log = logging.getLogger(__name__)
+
+# Fields save() may coalesce
+_FIELDS = ("status", "progress", "stage", "eta_seconds", "phase")
+
+
+def _normalize(field: str, value):
+    if value is None:
+        return None
+    if field == "progress":
+        return round(float(value), 3)
+    if field == "eta_seconds":
+        return round(float(value))
+    if field == "stage":
+        return str(value)[:128]
+    return value
+
+
+class JobStateWriter:
+    def __init__(self, interval: float = JOB_STATE_FLUSH_INTERVAL):
+        self.interval = interval
+        self._pending: dict[str, dict] = {}  # job_id -> fields to write
+        self._task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+        self.saves = 0
+        self.skipped = 0
+        self.flushes = 0
+        self.rows_written = 0
+
+    def save(self, job: Job, **fields) -> bool:
+        """Apply fields to the job, publish it and queue the write. False if nothing changed."""
+        self.saves += 1
+        changed = {}
+        for field, value in fields.items():
+            if field not in _FIELDS:
+                raise ValueError(f"job_state.save() cannot write {field!r}")
+            if field == "status" and value in TERMINAL:
+                raise ValueError("Terminal states are committed with finish()")
+            value = _normalize(field, value)
+            if getattr(job, field) != value:
+                changed[field] = value
+        if not changed:
+            self.skipped += 1
+            return False
+        for field, value in changed.items():
+            # Keep the handler's session clean; this writer owns these columns
+            set_committed_value(job, field, value)
+        self._pending.setdefault(job.id, {}).update(changed)
+        job_events.publish(job)
+        self._ensure_running()
+        return True
+
+    async def finish(self, db, job: Job):
+        """Commit the handler's session with the job's full current state, now.
+
+        Used for terminal states (and anything else that must not wait): the
+        coalesced fields are written too, since earlier saves only changed
+        them in memory.
+        """
+        for field in _FIELDS:
+            flag_modified(job, field)
+        self._pending.pop(job.id, None)
+        await db.commit()
+        job_events.publish(job)
+
+    def discard(self, job_id: str):
+        """Drop queued changes for a job whose state is being reset elsewhere."""
+        self._pending.pop(job_id, None)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            await asyncio.sleep(self.interval)  # let reports from other jobs pile up
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("Job state flush failed")
+
+    async def flush(self):
+        """Write all queued changes in one transaction."""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        async with async_session() as db:
+            for job_id, fields in batch.items():
+                # Never overwrite a final state committed in the meantime, nor
+                # bring back "running" on a job that has been requeued since
+                await db.execute(
+                    update(Job).where(Job.id == job_id, Job.status.not_in((*TERMINAL, "pending"))).values(**fields)
+                )
+            await db.commit()
+        self.flushes += 1
+        self.rows_written += len(batch)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "saves": self.saves,
+            "skipped_unchanged": self.skipped,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "pending_jobs": len(self._pending),
+            "interval": self.interval,
+        }
+
+
+job_state = JobStateWriter()
@@ -1,8 +1,13 @@
 """Lyrics & prompt generation via ModuLLe."""
 
+import asyncio
+import logging
+
 from app.config import LYRICS_PROMPT_PATH
-from app.database import async_session
-from app.models import Setting
+from app.services.circuit import get_breaker
+from app.services.settings_cache import settings_cache
+
+log = logging.getLogger(__name__)
 
 
 def _read_system_prompt() -> str:
@@ -13,14 +18,8 @@ def _read_system_prompt() -> str:
 
 
 async def _get_llm_settings() -> dict:
-    """Read LLM settings from DB."""
-    async with async_session() as db:
-        keys = ["llm_provider", "llm_base_url", "llm_api_key", "llm_model"]
-        result = {}
-        for k in keys:
-            row = await db.get(Setting, k)
-            result[k] = row.value if row and row.value else ""
-        return result
+    """Read LLM settings from the settings cache."""
+    return await settings_cache.get_many(["llm_provider", "llm_base_url", "llm_api_key", "llm_model"])
 
 
 async def generate_lyrics(description: str, instrumental: bool = False) -> dict:
@@ -60,11 +59,14 @@ async def generate_lyrics(description: str, instrumental: bool = False) -> dict:
     else:
         user_prompt = f"Create a song based on this description: {description}"
 
-    raw = text_processor.generate(
-        prompt=user_prompt,
-        system_prompt=system_prompt,
-        temperature=0.8,
-    )
+    with get_breaker("llm"):
+        # Blocking client; keep the event loop (and ACE-Step polling) running
+        raw = await asyncio.to_thread(
+            text_processor.generate,
+            prompt=user_prompt,
+            system_prompt=system_prompt,
+            temperature=0.8,
+        )
 
     if not raw:
         return {"error": "LLM returned empty response"}
@@ -230,10 +232,30 @@ async def generate_art_prompt(
 
     user_prompt = "Write an album cover art prompt for this song:\n\n" + "\n".join(parts)
 
-    raw = text_processor.generate(
-        prompt=user_prompt,
-        system_prompt=_ART_PROMPT_SYSTEM,
-        temperature=0.9,
-    )
+    with get_breaker("llm"):
+        raw = await asyncio.to_thread(
+            text_processor.generate,
+            prompt=user_prompt,
+            system_prompt=_ART_PROMPT_SYSTEM,
+            temperature=0.9,
+        )
 
     return (raw or "Abstract album cover art, vivid colors, high quality").strip()
+
+
+async def song_art_prompt(
+    title: str = "",
+    caption: str = "",
+    lyrics: str = "",
+    persona_name: str = "",
+) -> str:
+    """generate_art_prompt(), falling back to a caption-based prompt if the LLM fails."""
+    try:
+        prompt = await generate_art_prompt(title=title, caption=caption, lyrics=lyrics, persona_name=persona_name)
+        log.info("LLM art prompt: %s", prompt)
+        return prompt
+    except Exception as e:
+        log.warning("LLM art prompt failed (%s), using fallback", e)
+        if caption:
+            return f"Album art for: {caption}, album cover art, high quality"
+        return f"Album art for: {title or 'music'}, album cover art, high quality"
@@ -0,0 +1,202 @@
+"""Periodic database upkeep: job retention, result trimming, ANALYZE and VACUUM.
+
+Every finished job keeps its full ACE-Step result and queue payload, so the
+jobs table only ever grows. Every MAINTENANCE_INTERVAL_HOURS (and once shortly
+after startup) this task:
+
+- deletes finished jobs not touched for JOB_RETENTION_DAYS; songs are kept,
+- trims result_json of older finished jobs down to the fields the app reads
+  back (file, seed, metas) and drops their payload_json; pipeline results
+  (stage timings) are kept as they are,
+- runs ANALYZE so the query planner knows about the indexes, and merges the
+  song search index,
+- runs VACUUM once free pages make up MAINTENANCE_VACUUM_FREE_RATIO of the file.
+
+Rows are processed in small batches so queue claims and progress flushes are
+never blocked for long.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete, update, func, text
+
+from app.config import (
+    JOB_RETENTION_DAYS, JOB_RESULT_TRIM_DAYS,
+    MAINTENANCE_INTERVAL_HOURS, MAINTENANCE_VACUUM_FREE_RATIO,
+)
+from app.database import engine, async_session
+from app.models import Job
+from app.services import search
+from app.services.job_events import TERMINAL
+
+log = logging.getLogger(__name__)
+
+_BATCH = 500
+# Results shorter than this are already trimmed (or were small to begin with)
+_TRIM_MIN_LENGTH = 2048
+# Keys of an ACE-Step result entry kept after trimming
+_KEEP_KEYS = ("file", "seed_value", "metas", "cached")
+# Job types whose result_json is not an ACE-Step result; the app reads it back whole
+_UNTRIMMED_TYPES = ("pipeline",)
+_STARTUP_DELAY = 60.0
+
+
+def trim_result(result_json: str) -> str | None:
+    """Reduce a stored ACE-Step result (one entry or a list of them) to _KEEP_KEYS."""
+    try:
+        result = json.loads(result_json)
+    except ValueError:
+        return None
+
+    def trim(entry):
+        if not isinstance(entry, dict):
+            return entry
+        return {k: entry[k] for k in _KEEP_KEYS if k in entry}
+
+    if isinstance(result, list):
+        return json.dumps([trim(e) for e in result])
+    return json.dumps(trim(result))
+
+
+def _cutoff(days: float) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+
+class Maintenance:
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self.runs = 0
+        self.last_run: dict | None = None
+
+    def start(self):
+        if MAINTENANCE_INTERVAL_HOURS > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run(), name="db-maintenance")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        await asyncio.sleep(_STARTUP_DELAY)
+        while True:
+            try:
+                await self.run()
+            except Exception:
+                log.exception("Database maintenance failed")
+            await asyncio.sleep(MAINTENANCE_INTERVAL_HOURS * 3600)
+
+    async def run(self, vacuum: bool | None = None) -> dict:
+        """One maintenance pass. vacuum=None vacuums only past the free-page ratio."""
+        started = time.monotonic()
+        report = {
+            "pruned_jobs": await self.prune_jobs(),
+            "trimmed_jobs": await self.trim_results(),
+        }
+        report.update(await self.optimize(vacuum))
+        report["seconds"] = round(time.monotonic() - started, 3)
+        report["at"] = datetime.now(timezone.utc).isoformat()
+        self.runs += 1
+        self.last_run = report
+        log.info("Database maintenance: %s", report)
+        return report
+
+    async def prune_jobs(self) -> int:
+        """Delete finished jobs older than JOB_RETENTION_DAYS."""
+        if JOB_RETENTION_DAYS <= 0:
+            return 0
+        cutoff = _cutoff(JOB_RETENTION_DAYS)
+        total = 0
+        while True:
+            async with async_session() as db:
+                ids = select(Job.id).where(Job.status.in_(TERMINAL), Job.updated_at < cutoff).limit(_BATCH)
+                result = await db.execute(delete(Job).where(Job.id.in_(ids)))
+                await db.commit()
+            total += result.rowcount
+            if result.rowcount < _BATCH:
+                return total
+            await asyncio.sleep(0)
+
+    async def trim_results(self) -> int:
+        """Trim result_json and drop payload_json of finished jobs older than JOB_RESULT_TRIM_DAYS."""
+        if JOB_RESULT_TRIM_DAYS <= 0:
+            return 0
+        cutoff = _cutoff(JOB_RESULT_TRIM_DAYS)
+        total = 0
+        last_id = ""
+        while True:
+            async with async_session() as db:
+                trimmable = Job.job_type.not_in(_UNTRIMMED_TYPES)
+                rows = (await db.execute(
+                    select(Job.id, Job.job_type, Job.result_json)
+                    .where(
+                        Job.status.in_(TERMINAL), Job.updated_at < cutoff, Job.id > last_id,
+                        (trimmable & (func.length(Job.result_json) >= _TRIM_MIN_LENGTH))
+                        | Job.payload_json.is_not(None),
+                    )
+                    .order_by(Job.id)
+                    .limit(_BATCH)
+                )).all()
+                if not rows:
+                    return total
+                for row in rows:
+                    values = {"payload_json": None}
+                    if (row.job_type not in _UNTRIMMED_TYPES and row.result_json
+                            and len(row.result_json) >= _TRIM_MIN_LENGTH):
+                        values["result_json"] = trim_result(row.result_json)
+                    # Keep updated_at so trimming does not postpone pruning
+                    await db.execute(
+                        update(Job).where(Job.id == row.id).values(**values, updated_at=Job.updated_at)
+                    )
+                await db.commit()
+            total += len(rows)
+            last_id = rows[-1].id
+            await asyncio.sleep(0)
+
+    async def optimize(self, vacuum: bool | None = None) -> dict:
+        """ANALYZE, and VACUUM if requested or worth it. Both run outside a transaction."""
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            page_count = (await conn.execute(text("PRAGMA page_count"))).scalar() or 0
+            free_pages = (await conn.execute(text("PRAGMA freelist_count"))).scalar() or 0
+            free_ratio = free_pages / page_count if page_count else 0.0
+            await conn.execute(text("ANALYZE"))
+            await search.optimize(conn)
+            if vacuum is None:
+                vacuum = free_ratio >= MAINTENANCE_VACUUM_FREE_RATIO
+            vacuumed = False
+            if vacuum:
+                try:
+                    await conn.execute(text("VACUUM"))
+                    vacuumed = True
+                except Exception as e:
+                    # Another connection is mid-write; the next run retries
+                    log.warning("VACUUM skipped: %s", e)
+            if vacuumed:
+                page_count = (await conn.execute(text("PRAGMA page_count"))).scalar() or 0
+        return {
+            "free_ratio": round(free_ratio, 3),
+            "vacuumed": vacuumed,
+            "page_count": page_count,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval_hours": MAINTENANCE_INTERVAL_HOURS,
+            "job_retention_days": JOB_RETENTION_DAYS,
+            "result_trim_days": JOB_RESULT_TRIM_DAYS,
+            "runs": self.runs,
+            "last_run": self.last_run,
+        }
+
+
+maintenance = Maintenance()
@@ -1,30 +1,61 @@
 """ACE-Step HTTP client - talks to the ACE-Step API on localhost:8001."""
 
+import os
 import json
+import time
+import base64
 import asyncio
+import hashlib
 import logging
+import uuid
+from pathlib import Path
+
 import httpx
 
-from app.config import ACESTEP_URL
+from app.config import POLL_MAX_DELAY, DOWNLOAD_CHUNK_SIZE, UPLOAD_CHUNK_SIZE
+from app.services import http_pool
+from app.services.backends import backend_pool
+from app.services.circuit import CircuitOpenError
+from app.services.job_queue import Requeue
 
 log = logging.getLogger(__name__)
 
+# Backends that answered /cancel_task with 404/405
+_no_cancel: set[str] = set()
 
-async def get_acestep_url() -> str:
-    """Get the ACE-Step URL, checking settings DB first."""
-    from app.database import async_session
-    from app.models import Setting
-    async with async_session() as db:
-        row = await db.get(Setting, "acestep_url")
-        return row.value if row and row.value else ACESTEP_URL
+# Shared pooled client, injected by the app lifespan via set_client()
+_client: httpx.AsyncClient | None = None
 
 
-async def health_check() -> bool:
-    url = await get_acestep_url()
+def set_client(client: httpx.AsyncClient | None):
+    """Install the shared ACE-Step HTTP client (None to detach it)."""
+    global _client
+    _client = client
+
+
+def _http() -> httpx.AsyncClient:
+    """Return the shared client, creating one lazily outside the app lifespan."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = http_pool.create_client()
+    return _client
+
+
+def pool_stats() -> dict:
+    """Connection pool statistics for the shared ACE-Step client."""
+    return http_pool.pool_stats(_client)
+
+
+async def get_acestep_url(task_id: str | None = None) -> str:
+    """Get the ACE-Step URL for a task (its pinned backend) or the preferred backend."""
+    return await backend_pool.url_for(task_id)
+
+
+async def health_check(url: str | None = None) -> bool:
+    url = url or await get_acestep_url()
     try:
-        async with httpx.AsyncClient(timeout=5) as client:
-            r = await client.get(f"{url}/health")
-            return r.status_code == 200
+        r = await _http().get(f"{url}/health", timeout=5)
+        return r.status_code == 200
     except Exception:
         return False
 
@@ -32,27 +63,58 @@ async def health_check() -> bool:
 async def submit_task(params: dict) -> dict:
     """Submit a music generation task to ACE-Step. Returns {task_id, status, queue_position}.
 
-    If reference_audio_path is present, switches to multipart form upload
-    because ACE-Step rejects absolute file paths outside its temp directory.
+    If reference_audio_path is present, the file is looked up in the reference
+    audio cache first and a cached server-side handle is sent in JSON mode.
+    Otherwise it switches to multipart form upload because ACE-Step rejects
+    absolute file paths outside its temp directory.
     """
-    url = await get_acestep_url()
-    ref_audio = params.pop("reference_audio_path", None)
+    url = await backend_pool.acquire()
+    try:
+        with backend_pool.breaker(url):
+            data = await _submit_to(url, params)
+    except Exception as e:
+        backend_pool.release(url)
+        if isinstance(e, httpx.TransportError):
+            backend_pool.mark_unhealthy(url)
+        raise
+
+    payload = data.get("data", data) if isinstance(data, dict) else None
+    task_id = payload.get("task_id") if isinstance(payload, dict) else None
+    if task_id:
+        backend_pool.pin(task_id, url)
+    else:
+        backend_pool.release(url)
+    return data
 
-    from pathlib import Path
 
-    async with httpx.AsyncClient(timeout=120) as client:
-        if ref_audio:
-            audio_path = Path(ref_audio)
-            if not audio_path.exists():
-                log.error("Reference audio file not found: %s", ref_audio)
-                ref_audio = None
+async def _submit_to(url: str, params: dict) -> dict:
+    from app.services.ref_audio import ref_audio_cache
 
-        if ref_audio:
-            audio_path = Path(ref_audio)
-            audio_bytes = audio_path.read_bytes()
+    ref_audio = params.pop("reference_audio_path", None)
+
+    client = _http()
+    if ref_audio:
+        audio_path = Path(ref_audio)
+        if not await asyncio.to_thread(audio_path.exists):
+            log.error("Reference audio file not found: %s", ref_audio)
+            ref_audio = None
+
+    r = None
+    if ref_audio:
+        audio_path = Path(ref_audio)
+        handle = await ref_audio_cache.lookup(url, audio_path)
+        if handle:
+            log.info("Reusing cached reference audio %s -> %s", audio_path.name, handle)
+            r = await client.post(
+                f"{url}/release_task", json={**params, "reference_audio_path": handle}, timeout=120
+            )
+            if 400 <= r.status_code < 500:
+                log.warning("ACE-Step rejected cached reference audio (%d), re-uploading", r.status_code)
+                await ref_audio_cache.invalidate(url, audio_path)
+                r = None
+
+        if r is None:
             mime = "audio/wav" if audio_path.suffix.lower() == ".wav" else "audio/mpeg"
-            files = {"ref_audio": (audio_path.name, audio_bytes, mime)}
-            log.info("Uploading reference audio: %s (%d bytes, %s)", audio_path.name, len(audio_bytes), mime)
             # Build form data with proper type handling
             form_data = {}
             for k, v in params.items():
@@ -63,37 +125,157 @@ async def submit_task(params: dict) -> dict:
                 else:
                     form_data[k] = str(v)
             log.info("Multipart form fields: %s", {k: v for k, v in form_data.items() if k != "lyrics"})
-            r = await client.post(f"{url}/release_task", data=form_data, files=files)
+            headers, body = await _multipart_stream(form_data, "ref_audio", audio_path, mime)
+            log.info("Uploading reference audio: %s (%s bytes, %s)",
+                     audio_path.name, headers["Content-Length"], mime)
+            r = await client.post(f"{url}/release_task", content=body, headers=headers, timeout=120)
+            if r.is_success:
+                await ref_audio_cache.remember(url, audio_path, r.json())
+    else:
+        log.info("Submitting without reference audio (JSON mode)")
+        r = await client.post(f"{url}/release_task", json=params, timeout=120)
+
+    r.raise_for_status()
+    data = r.json()
+    log.info("ACE-Step /release_task response (%s): %s", url, data)
+    return data
+
+
+async def _multipart_stream(fields: dict, file_field: str, path: Path, mime: str):
+    """Build a multipart/form-data body that streams the file from disk.
+
+    Returns (headers, async_iterator). The file is read in chunks in a worker
+    thread, so neither a full in-memory copy nor blocking reads on the event
+    loop are needed. Content-Length is computed up front from the file size.
+    """
+    boundary = uuid.uuid4().hex
+    head = bytearray()
+    for name, value in fields.items():
+        head += (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+        ).encode()
+        head += value.encode("utf-8") + b"\r\n"
+    filename = path.name.replace("\\", "\\\\").replace('"', '\\"')
+    head += (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+        f'filename="{filename}"\r\nContent-Type: {mime}\r\n\r\n'
+    ).encode("utf-8")
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    size = (await asyncio.to_thread(path.stat)).st_size
+
+    async def body():
+        yield bytes(head)
+        f = await asyncio.to_thread(open, path, "rb")
+        try:
+            remaining = size
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(UPLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise RuntimeError(f"{path.name} shrank while uploading")
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(f.close)
+        yield tail
+
+    headers = {
+        "Content-Type": f"multipart/form-data; boundary={boundary}",
+        "Content-Length": str(len(head) + size + len(tail)),
+    }
+    return headers, body()
+
+
+def _parse_entry(entry: dict) -> dict:
+    """Parse the result JSON string of a /query_result entry if present."""
+    if isinstance(entry.get("result"), str) and entry["result"]:
+        try:
+            entry["result_parsed"] = json.loads(entry["result"])
+        except json.JSONDecodeError:
+            entry["result_parsed"] = None
+    return entry
+
+
+async def query_results(task_ids: list[str]) -> dict[str, dict]:
+    """Poll ACE-Step for several tasks. Returns {task_id: entry}.
+
+    Task ids are grouped by the backend they are pinned to, with one request
+    per backend. Tasks whose backend could not be queried map to the
+    exception instead of an entry.
+    """
+    groups: dict[str, list[str]] = {}
+    for task_id in task_ids:
+        groups.setdefault(await get_acestep_url(task_id), []).append(task_id)
+    replies = await asyncio.gather(
+        *(_query_backend(url, ids) for url, ids in groups.items()), return_exceptions=True
+    )
+    results = {}
+    for ids, reply in zip(groups.values(), replies):
+        if isinstance(reply, Exception):
+            results.update(dict.fromkeys(ids, reply))
         else:
-            log.info("Submitting without reference audio (JSON mode)")
-            r = await client.post(f"{url}/release_task", json=params)
+            results.update(reply)
+    return results
+
 
+async def _query_backend(url: str, task_ids: list[str]) -> dict[str, dict]:
+    with backend_pool.breaker(url):
+        r = await _http().post(f"{url}/query_result", json={"task_id_list": task_ids}, timeout=30)
         r.raise_for_status()
-        data = r.json()
-        log.info("ACE-Step /release_task response: %s", data)
-        return data
+    data = r.json()
+    # Unwrap {"data": [...], "code": 200} envelope if present
+    if isinstance(data, dict) and "data" in data:
+        data = data["data"]
+    if not isinstance(data, list):
+        return {}
+    results = {}
+    for i, entry in enumerate(data):
+        if not isinstance(entry, dict):
+            continue
+        # Entries normally carry their task_id; fall back to request order
+        task_id = entry.get("task_id") or (task_ids[i] if i < len(task_ids) else None)
+        if task_id:
+            results[task_id] = _parse_entry(entry)
+    return results
 
 
 async def query_result(task_id: str) -> dict:
     """Poll ACE-Step for task result. Returns the first result entry."""
-    url = await get_acestep_url()
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.post(f"{url}/query_result", json={"task_id_list": [task_id]})
-        r.raise_for_status()
-        data = r.json()
-        # Unwrap {"data": [...], "code": 200} envelope if present
-        if isinstance(data, dict) and "data" in data:
-            data = data["data"]
-        if isinstance(data, list) and data:
-            entry = data[0]
-            # Parse result JSON string if present
-            if isinstance(entry.get("result"), str) and entry["result"]:
-                try:
-                    entry["result_parsed"] = json.loads(entry["result"])
-                except json.JSONDecodeError:
-                    entry["result_parsed"] = None
-            return entry
-        return {"status": 0, "progress_text": "Waiting..."}
+    results = await query_results([task_id])
+    entry = results.get(task_id)
+    if isinstance(entry, Exception):
+        raise entry
+    return entry or {"status": 0, "progress_text": "Waiting..."}
+
+
+def can_cancel(task_id: str) -> bool:
+    """Whether the task's backend is not known to lack /cancel_task."""
+    url = backend_pool.pinned(task_id)
+    return bool(url) and url not in _no_cancel
+
+
+async def cancel_task(task_id: str) -> bool:
+    """Ask the backend running a task to abort it. Best effort.
+
+    Returns True if the backend accepted the request. Backends without a
+    /cancel_task endpoint (404/405) are remembered and not asked again; the
+    task then runs to completion there and its result is simply ignored.
+    """
+    url = backend_pool.pinned(task_id)
+    if not url or url in _no_cancel:
+        return False
+    try:
+        r = await _http().post(f"{url}/cancel_task", json={"task_id": task_id}, timeout=10)
+    except httpx.HTTPError as e:
+        log.warning("Could not cancel ACE-Step task %s: %s", task_id, e)
+        return False
+    if r.status_code in (404, 405):
+        log.info("ACE-Step backend %s does not support cancelling tasks", url)
+        _no_cancel.add(url)
+        return False
+    if r.is_error:
+        log.warning("ACE-Step refused to cancel task %s: HTTP %d", task_id, r.status_code)
+        return False
+    return True
 
 
 async def format_input(prompt: str, lyrics: str, params: dict | None = None) -> dict:
@@ -102,79 +284,193 @@ async def format_input(prompt: str, lyrics: str, params: dict | None = None) ->
     body = {"prompt": prompt, "lyrics": lyrics}
     if params:
         body["param_obj"] = params
-    async with httpx.AsyncClient(timeout=120) as client:
-        r = await client.post(f"{url}/format_input", json=body)
+    with backend_pool.breaker(url):
+        r = await _http().post(f"{url}/format_input", json=body, timeout=120)
         r.raise_for_status()
-        return r.json()
+    return r.json()
 
 
-async def get_audio_url(file_path: str) -> str:
+async def get_audio_url(file_path: str, task_id: str | None = None) -> str:
     """Build the URL to stream an audio file from ACE-Step."""
-    url = await get_acestep_url()
+    url = await get_acestep_url(task_id)
     return f"{url}/v1/audio?path={file_path}"
 
 
-async def download_audio(file_ref: str) -> bytes:
-    """Download audio bytes from ACE-Step.
+def _resolve_download_url(base: str, file_ref: str) -> str:
+    if file_ref.startswith("/v1/") or file_ref.startswith("http"):
+        # Already a URL path - just prepend the base
+        return f"{base}{file_ref}" if file_ref.startswith("/") else file_ref
+    # Raw file path - use the /v1/audio endpoint
+    return f"{base}/v1/audio?path={file_ref}"
+
+
+def _expected_sha256(headers: httpx.Headers) -> str | None:
+    """Pull a SHA-256 digest from the response headers, if the server sent one."""
+    value = headers.get("x-checksum-sha256")
+    if value:
+        return value.strip().lower()
+    for header in ("repr-digest", "digest"):
+        for part in headers.get(header, "").split(","):
+            algo, _, encoded = part.strip().partition("=")
+            if algo.lower() == "sha-256" and encoded:
+                try:
+                    return base64.b64decode(encoded.strip(":")).hex()
+                except ValueError:
+                    return None
+    return None
+
+
+async def download_audio(file_ref: str, dest: str | Path, task_id: str | None = None) -> dict:
+    """Stream an audio file from ACE-Step straight to disk.
 
     file_ref may be:
       - A URL path like "/v1/audio?path=/home/.../foo.mp3"
       - A raw file path like "/home/.../foo.mp3"
+
+    Chunks are written to a ".part" file next to dest (off the event loop) and
+    renamed into place only once the body is complete, so memory use stays
+    constant and dest never holds a truncated file. The byte count is checked
+    against Content-Length and the SHA-256 against any digest header.
+
+    task_id selects the backend the task ran on.
+
+    Returns {path, bytes, sha256, seconds, bytes_per_sec}.
     """
-    base = await get_acestep_url()
-    if file_ref.startswith("/v1/") or file_ref.startswith("http"):
-        # Already a URL path - just prepend the base
-        download_url = f"{base}{file_ref}" if file_ref.startswith("/") else file_ref
-    else:
-        # Raw file path - use the /v1/audio endpoint
-        download_url = f"{base}/v1/audio?path={file_ref}"
+    base = await get_acestep_url(task_id)
+    download_url = _resolve_download_url(base, file_ref)
+    dest = Path(dest)
+    tmp = dest.with_name(dest.name + ".part")
+    digest = hashlib.sha256()
+    written = 0
+    started = time.monotonic()
 
-    async with httpx.AsyncClient(timeout=120) as client:
-        r = await client.get(download_url)
-        r.raise_for_status()
-        return r.content
+    try:
+        with backend_pool.breaker(base):
+            async with _http().stream("GET", download_url, timeout=120) as r:
+                r.raise_for_status()
+                expected_len = r.headers.get("content-length")
+                if r.headers.get("content-encoding"):
+                    expected_len = None  # length refers to the encoded body
+                expected_sha = _expected_sha256(r.headers)
+
+                f = await asyncio.to_thread(open, tmp, "wb")
+                try:
+                    async for chunk in r.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        digest.update(chunk)
+                        written += len(chunk)
+                        await asyncio.to_thread(f.write, chunk)
+                    await asyncio.to_thread(_flush_and_sync, f)
+                finally:
+                    await asyncio.to_thread(f.close)
+
+        if expected_len is not None and int(expected_len) != written:
+            raise RuntimeError(f"Incomplete audio download: got {written} of {expected_len} bytes")
+        sha256 = digest.hexdigest()
+        if expected_sha and expected_sha != sha256:
+            raise RuntimeError(f"Audio checksum mismatch: expected {expected_sha}, got {sha256}")
+
+        await asyncio.to_thread(os.replace, tmp, dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+    seconds = time.monotonic() - started
+    stats = {
+        "path": str(dest),
+        "bytes": written,
+        "sha256": sha256,
+        "seconds": round(seconds, 3),
+        "bytes_per_sec": round(written / seconds) if seconds > 0 else None,
+    }
+    log.info("Downloaded %s (%d bytes, %.1f KiB/s)", dest.name, written,
+             (stats["bytes_per_sec"] or 0) / 1024)
+    return stats
+
+
+def _flush_and_sync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def entry_progress(result: dict) -> float | None:
+    """Extract the progress fraction from a /query_result entry, if reported."""
+    parsed = result.get("result_parsed")
+    if isinstance(parsed, list) and parsed and isinstance(parsed[0], dict):
+        try:
+            return float(parsed[0].get("progress", 0) or 0)
+        except (TypeError, ValueError):
+            return None
+    return None
 
 
 async def poll_until_done(task_id: str, on_progress=None, timeout_seconds: int = 900) -> dict:
-    """Poll ACE-Step until task completes or fails. Returns final result entry.
+    """Wait for an ACE-Step task to complete or fail. Returns final result entry.
+
+    Polling is done by the shared batched poller; this consumes its results and
+    schedules the next poll from the progress rate (fast near the predicted
+    finish, backing off otherwise). Each entry passed to on_progress carries an
+    "eta_seconds" estimate. The timeout is measured on the monotonic clock.
 
     Individual poll failures are tolerated (logged and retried) - only consecutive
-    failures beyond a threshold will abort the job.
+    failures beyond a threshold will abort the job. If the backend's circuit
+    opens, Requeue is raised so the job keeps its task and resumes polling later.
     """
-    elapsed = 0
-    interval = 3
+    from app.services.poller import task_poller, ProgressEstimator
+
+    deadline = time.monotonic() + timeout_seconds
+    estimator = ProgressEstimator()
     consecutive_errors = 0
     max_consecutive_errors = 10
 
-    while elapsed < timeout_seconds:
-        try:
-            result = await query_result(task_id)
-            consecutive_errors = 0  # reset on success
-        except Exception as e:
-            consecutive_errors += 1
-            log.warning("Poll error (%d/%d): %s", consecutive_errors, max_consecutive_errors, e)
-            if consecutive_errors >= max_consecutive_errors:
-                raise RuntimeError(
-                    f"Lost contact with ACE-Step after {max_consecutive_errors} consecutive poll failures: {e}"
-                )
-            await asyncio.sleep(interval)
-            elapsed += interval
-            continue
-
-        status = result.get("status", 0)
-
-        if on_progress:
+    updates = task_poller.watch(task_id)
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
             try:
-                await on_progress(result)
-            except Exception:
-                pass  # don't let a progress update crash the job
+                kind, payload = await asyncio.wait_for(updates.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+
+            if kind == "error":
+                if isinstance(payload, CircuitOpenError):
+                    # The backend is down, but the task may still be rendering there:
+                    # give up the worker and re-attach to it once the circuit closes
+                    raise Requeue("ACE-Step unavailable") from payload
+                consecutive_errors += 1
+                log.warning("Poll error (%d/%d): %s", consecutive_errors, max_consecutive_errors, payload)
+                if consecutive_errors >= max_consecutive_errors:
+                    raise RuntimeError(
+                        f"Lost contact with ACE-Step after {max_consecutive_errors} consecutive poll failures: {payload}"
+                    )
+                task_poller.schedule(task_id, min(POLL_MAX_DELAY, 2 ** consecutive_errors))
+                continue
+
+            consecutive_errors = 0  # reset on success
+            result = payload
+            status = result.get("status", 0)
 
-        if status == 1:  # success
-            return result
-        elif status == 2:  # failed
-            raise RuntimeError(result.get("progress_text", "Generation failed"))
+            progress = entry_progress(result)
+            if progress is not None:
+                estimator.update(progress)
+            eta = estimator.eta()
+            result["eta_seconds"] = round(eta, 1) if eta is not None else None
 
-        await asyncio.sleep(interval)
-        elapsed += interval
+            if on_progress:
+                try:
+                    await on_progress(result)
+                except Exception:
+                    pass  # don't let a progress update crash the job
+
+            if status == 1:  # success
+                return result
+            elif status == 2:  # failed
+                raise RuntimeError(result.get("progress_text", "Generation failed"))
+
+            task_poller.schedule(task_id, estimator.next_delay())
+    finally:
+        task_poller.unwatch(task_id)
+        backend_pool.finish(task_id)
 
     raise TimeoutError(f"Music generation timed out after {timeout_seconds}s")
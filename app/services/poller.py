@@ -0,0 +1,204 @@
+"""Central ACE-Step poller - one batched /query_result request per tick.
+
+Jobs register their ACE-Step task ids with the shared poller instead of running
+their own polling loops. Each task carries its own due time (see
+ProgressEstimator); a tick queries every task that is due in a single request
+and hands each result back to the job waiting on it. The minimum spacing
+between requests grows with the number of active tasks so a large queue does
+not hammer the backend.
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+from app.config import (
+    POLL_MIN_INTERVAL,
+    POLL_MAX_INTERVAL,
+    POLL_INTERVAL_PER_TASK,
+    POLL_BATCH_SIZE,
+    POLL_MIN_DELAY,
+    POLL_MAX_DELAY,
+)
+from app.services import music as music_svc
+
+log = logging.getLogger(__name__)
+
+
+class ProgressEstimator:
+    """Predict completion from the progress deltas ACE-Step reports.
+
+    Keeps an exponentially weighted progress rate (fraction per second) and
+    turns it into an ETA and the delay before the next poll: short when the
+    task is predicted to finish soon, backing off with jitter otherwise -
+    before a rate exists, and once progress stalls past the predicted finish
+    (queued inside ACE-Step, or a long decode stage). Every delay is jittered.
+    """
+
+    BASE_DELAY = 1.0
+
+    def __init__(self, smoothing: float = 0.4):
+        self.smoothing = smoothing
+        self.rate: float | None = None
+        self.progress = 0.0
+        self._last: tuple[float, float] | None = None
+        self._idle_delay = self.BASE_DELAY
+
+    def update(self, progress: float, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        progress = max(0.0, min(1.0, float(progress or 0.0)))
+        if self._last is not None:
+            t0, p0 = self._last
+            dt = now - t0
+            if dt > 0 and progress > p0:
+                self._idle_delay = self.BASE_DELAY
+                # Leaving 0 only says the task started at some point since the last
+                # poll (it may have been queued inside ACE-Step); rate from the next move
+                if p0 > 0:
+                    sample = (progress - p0) / dt
+                    self.rate = sample if self.rate is None else (
+                        self.smoothing * sample + (1 - self.smoothing) * self.rate
+                    )
+        if self._last is None or progress != self._last[1]:
+            self._last = (now, progress)
+        self.progress = progress
+
+    def eta(self, now: float | None = None) -> float | None:
+        """Seconds until predicted completion, or None without a rate yet."""
+        if not self.rate or self._last is None:
+            return None
+        now = time.monotonic() if now is None else now
+        since = now - self._last[0]
+        return max(0.0, (1.0 - self.progress) / self.rate - since)
+
+    def next_delay(self) -> float:
+        eta = self.eta()
+        if eta:
+            # Converge on the predicted finish: poll at half the remaining time
+            delay = eta / 2
+        else:
+            # No rate yet, or no progress past the predicted finish - back off
+            # until progress moves again (update() resets the backoff)
+            delay = self._idle_delay
+            self._idle_delay = min(POLL_MAX_DELAY, self._idle_delay * 1.5)
+        delay = max(POLL_MIN_DELAY, min(POLL_MAX_DELAY, delay))
+        # +-20% jitter, kept within the bounds so it still applies at the floor
+        return random.uniform(max(POLL_MIN_DELAY, delay * 0.8), min(POLL_MAX_DELAY, delay * 1.2))
+
+
+class TaskPoller:
+    def __init__(self):
+        self._watchers: dict[str, asyncio.Queue] = {}
+        self._due: dict[str, float] = {}
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._last_request = 0.0
+        self.ticks = 0
+        self.requests = 0
+
+    def watch(self, task_id: str) -> asyncio.Queue:
+        """Register a task id. Poll outcomes arrive on the returned queue as
+        ("result", entry) or ("error", exception) tuples."""
+        queue = self._watchers.get(task_id)
+        if queue is None:
+            queue = asyncio.Queue()
+            self._watchers[task_id] = queue
+            self._due[task_id] = time.monotonic()
+        self._ensure_running()
+        self._wake.set()
+        return queue
+
+    def schedule(self, task_id: str, delay: float):
+        """Set when a task should next be included in a poll."""
+        if task_id in self._watchers:
+            self._due[task_id] = time.monotonic() + delay
+            self._wake.set()
+
+    def unwatch(self, task_id: str):
+        self._watchers.pop(task_id, None)
+        self._due.pop(task_id, None)
+
+    def interval(self) -> float:
+        """Minimum seconds between requests, scaled by the number of active tasks."""
+        n = len(self._watchers)
+        return min(POLL_MAX_INTERVAL, POLL_MIN_INTERVAL + POLL_INTERVAL_PER_TASK * max(0, n - 1))
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "active_tasks": len(self._watchers),
+            "interval": self.interval(),
+            "ticks": self.ticks,
+            "requests": self.requests,
+        }
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="acestep-poller")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            if not self._watchers:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+
+            now = time.monotonic()
+            next_at = max(min(self._due.values()), self._last_request + self.interval())
+            if next_at > now:
+                # Sleep until the next task is due, or until schedules change
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=next_at - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._tick()
+            except Exception:
+                log.exception("Poller tick failed")
+
+    async def _tick(self):
+        self.ticks += 1
+        now = time.monotonic()
+        self._last_request = now
+        # Coalesce tasks that are due shortly so they share this request
+        horizon = now + POLL_MIN_DELAY
+        task_ids = [t for t, due in self._due.items() if due <= horizon]
+        for task_id in task_ids:
+            # Fallback schedule in case the consumer does not reschedule
+            self._due[task_id] = now + POLL_MAX_DELAY
+        for i in range(0, len(task_ids), POLL_BATCH_SIZE):
+            batch = task_ids[i:i + POLL_BATCH_SIZE]
+            self.requests += 1
+            try:
+                results = await music_svc.query_results(batch)
+            except Exception as e:
+                for task_id in batch:
+                    self._deliver(task_id, ("error", e))
+                continue
+            for task_id in batch:
+                entry = results.get(task_id) or {"status": 0, "progress_text": "Waiting..."}
+                if isinstance(entry, Exception):
+                    self._deliver(task_id, ("error", entry))
+                else:
+                    self._deliver(task_id, ("result", entry))
+
+    def _deliver(self, task_id: str, item: tuple):
+        queue = self._watchers.get(task_id)
+        if queue is not None:
+            queue.put_nowait(item)
+
+
+task_poller = TaskPoller()
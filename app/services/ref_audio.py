@@ -0,0 +1,149 @@
+"""Content-addressed cache of persona reference audio on the ACE-Step side.
+
+Each reference file is hashed once (the digest is cached against its size and
+mtime). A hash can map to a handle ACE-Step can read directly, so later
+submissions send that path instead of re-uploading the same bytes:
+
+  - With ACESTEP_STAGING_DIR set (a directory ACE-Step accepts paths from,
+    e.g. its temp dir), the file is copied there once as <sha256><ext>.
+  - Otherwise, if ACE-Step reports where it stored an uploaded file, that
+    server-side path is remembered per backend.
+
+Entries are evicted least-recently-used beyond REF_AUDIO_CACHE_SIZE and
+invalidated when ACE-Step rejects a cached handle, which forces a re-upload.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+
+from app.config import ACESTEP_STAGING_DIR, REF_AUDIO_CACHE_SIZE
+
+log = logging.getLogger(__name__)
+
+# Keys in a /release_task response that may carry the stored upload path
+_RESPONSE_PATH_KEYS = ("reference_audio_path", "ref_audio_path", "src_audio_path")
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stage_file(src: Path, dest: Path):
+    tmp = dest.with_name(dest.name + ".part")
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+
+class RefAudioCache:
+    def __init__(self, max_entries: int = REF_AUDIO_CACHE_SIZE, staging_dir: str = ACESTEP_STAGING_DIR):
+        self.max_entries = max_entries
+        self.staging_dir = Path(staging_dir) if staging_dir else None
+        # (path, size, mtime_ns) -> sha256
+        self._digests: dict[tuple[str, int, int], str] = {}
+        # (backend_url, sha256) -> server-readable path, in LRU order
+        self._handles: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    async def digest(self, path: Path) -> tuple[str, int]:
+        """Return (sha256, size) for a file, hashing it only when it changed."""
+        st = await asyncio.to_thread(path.stat)
+        key = (str(path), st.st_size, st.st_mtime_ns)
+        sha = self._digests.get(key)
+        if sha is None:
+            sha = await asyncio.to_thread(_hash_file, path)
+            self._digests = {k: v for k, v in self._digests.items() if k[0] != key[0]}
+            self._digests[key] = sha
+        return sha, st.st_size
+
+    async def lookup(self, backend_url: str, path: Path) -> str | None:
+        """Return a handle ACE-Step can read for this file, or None to upload it."""
+        sha, size = await self.digest(path)
+        async with self._lock:
+            handle = self._handles.get((backend_url, sha))
+            if handle is None and self.staging_dir is not None:
+                handle = await self._stage(sha, path)
+                if handle:
+                    self._store((backend_url, sha), handle)
+            if handle is None:
+                self.misses += 1
+                return None
+            self._handles.move_to_end((backend_url, sha))
+            self.hits += 1
+            self.bytes_saved += size
+            return handle
+
+    async def remember(self, backend_url: str, path: Path, response: dict):
+        """Record where ACE-Step stored an uploaded file, if the response says."""
+        payload = response.get("data", response) if isinstance(response, dict) else None
+        if not isinstance(payload, dict):
+            return
+        handle = next((payload[k] for k in _RESPONSE_PATH_KEYS if isinstance(payload.get(k), str)), None)
+        if not handle:
+            return
+        sha, _ = await self.digest(path)
+        async with self._lock:
+            self._store((backend_url, sha), handle)
+
+    async def invalidate(self, backend_url: str, path: Path):
+        """Forget the cached handle for a file, e.g. after ACE-Step rejected it."""
+        sha, _ = await self.digest(path)
+        async with self._lock:
+            self._drop((backend_url, sha))
+
+    def forget_file(self, path: str | Path):
+        """Drop cached digests for a file that was replaced or deleted."""
+        path = str(path)
+        self._digests = {k: v for k, v in self._digests.items() if k[0] != path}
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._handles),
+            "max_entries": self.max_entries,
+            "staging_dir": str(self.staging_dir) if self.staging_dir else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes_saved": self.bytes_saved,
+        }
+
+    async def _stage(self, sha: str, path: Path) -> str | None:
+        dest = self.staging_dir / f"{sha}{path.suffix.lower()}"
+        try:
+            if not await asyncio.to_thread(dest.exists):
+                await asyncio.to_thread(self.staging_dir.mkdir, parents=True, exist_ok=True)
+                await asyncio.to_thread(_stage_file, path, dest)
+                log.info("Staged reference audio %s as %s", path.name, dest.name)
+        except OSError as e:
+            log.warning("Could not stage reference audio in %s: %s", self.staging_dir, e)
+            return None
+        return str(dest)
+
+    def _store(self, key: tuple[str, str], handle: str):
+        self._handles[key] = handle
+        self._handles.move_to_end(key)
+        while len(self._handles) > self.max_entries:
+            oldest = next(iter(self._handles))
+            self._drop(oldest)
+
+    def _drop(self, key: tuple[str, str]):
+        handle = self._handles.pop(key, None)
+        if handle and self.staging_dir is not None:
+            staged = Path(handle)
+            if staged.parent == self.staging_dir and not any(
+                h == handle for h in self._handles.values()
+            ):
+                staged.unlink(missing_ok=True)
+
+
+ref_audio_cache = RefAudioCache()
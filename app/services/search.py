@@ -0,0 +1,109 @@
+"""Full-text search over the song library with SQLite FTS5.
+
+songs_fts is an external-content FTS5 index over songs.title, artist,
+caption and lyrics: it stores only the index and reads the text from the
+songs table. Triggers keep it in sync on insert, update and delete, so ORM
+writes need no extra code. install() creates the table and triggers on
+databases that lack them and backfills the index from existing songs.
+
+Results are ranked with bm25 (a title match outweighs an artist, caption or
+lyrics match) and come with a highlighted snippet. If this SQLite build has
+no FTS5, search() returns None and callers fall back to LIKE.
+"""
+
+import html
+import logging
+import re
+
+from sqlalchemy import text
+
+log = logging.getLogger(__name__)
+
+# bm25 column weights: title, artist, caption, lyrics
+_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+_SNIPPET_TOKENS = 12
+# Highlight markers that cannot occur in song text; replaced after HTML-escaping
+_OPEN, _CLOSE = "\x02", "\x03"
+
+available = False
+
+_DDL = (
+    """CREATE VIRTUAL TABLE songs_fts USING fts5(
+        title, artist, caption, lyrics,
+        content='songs', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER songs_fts_insert AFTER INSERT ON songs BEGIN
+        INSERT INTO songs_fts(rowid, title, artist, caption, lyrics)
+        VALUES (new.id, new.title, new.artist, new.caption, new.lyrics);
+    END""",
+    """CREATE TRIGGER songs_fts_delete AFTER DELETE ON songs BEGIN
+        INSERT INTO songs_fts(songs_fts, rowid, title, artist, caption, lyrics)
+        VALUES ('delete', old.id, old.title, old.artist, old.caption, old.lyrics);
+    END""",
+    # Only reindex when searchable text changes, not on every status update
+    """CREATE TRIGGER songs_fts_update AFTER UPDATE OF title, artist, caption, lyrics ON songs BEGIN
+        INSERT INTO songs_fts(songs_fts, rowid, title, artist, caption, lyrics)
+        VALUES ('delete', old.id, old.title, old.artist, old.caption, old.lyrics);
+        INSERT INTO songs_fts(rowid, title, artist, caption, lyrics)
+        VALUES (new.id, new.title, new.artist, new.caption, new.lyrics);
+    END""",
+)
+
+
+def install(conn):
+    """Create songs_fts and its triggers if missing, backfilling existing songs. Sync; runs in init_db."""
+    global available
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'songs_fts'")).first()
+    if exists:
+        available = True
+        return
+    try:
+        for ddl in _DDL:
+            conn.execute(text(ddl))
+    except Exception as e:
+        if "fts5" not in str(e).lower():
+            raise
+        log.warning("SQLite has no FTS5; song search falls back to LIKE")
+        available = False
+        return
+    conn.execute(text("INSERT INTO songs_fts(songs_fts) VALUES ('rebuild')"))
+    available = True
+    log.info("Built full-text index for existing songs")
+
+
+def match_query(q: str) -> str | None:
+    """FTS5 query for free text: every word must match, as a prefix. None if q has no words."""
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    return " ".join('"' + w.replace('"', '""') + '"*' for w in words)
+
+
+async def search(db, q: str, offset: int = 0, limit: int = 50) -> list[dict] | None:
+    """Ranked matches as {"id", "rank", "snippet"}, best first; None without FTS5."""
+    if not available:
+        return None
+    query = match_query(q)
+    if query is None:
+        return []
+    rows = await db.execute(
+        text(
+            f"SELECT rowid, bm25(songs_fts, {', '.join(map(str, _WEIGHTS))}) AS rank, "
+            f"snippet(songs_fts, -1, :open, :close, '…', {_SNIPPET_TOKENS}) AS snippet "
+            "FROM songs_fts WHERE songs_fts MATCH :query ORDER BY rank LIMIT :limit OFFSET :offset"
+        ),
+        {"open": _OPEN, "close": _CLOSE, "query": query, "limit": limit, "offset": offset},
+    )
+    return [{"id": row.rowid, "rank": round(-row.rank, 4), "snippet": _highlight(row.snippet)} for row in rows]
+
+
+def _highlight(snippet: str | None) -> str:
+    """Escape song text for HTML and turn the match markers into <mark> tags."""
+    escaped = html.escape(snippet or "")
+    return escaped.replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+async def optimize(conn):
+    """Merge the index's b-trees; run from database maintenance."""
+    if available:
+        await conn.execute(text("INSERT INTO songs_fts(songs_fts) VALUES ('optimize')"))
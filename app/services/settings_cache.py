@@ -0,0 +1,104 @@
+"""Process-wide snapshot of the settings table.
+
+Services used to read settings key by key from the database on every call
+(every LLM request, art render and TTS call). The settings table is small and
+only changes through this process, so it is read once into a dict and served
+from memory from then on.
+
+update() writes all changed keys with a single upsert and then swaps in a new
+snapshot, so readers see either the old settings or the new ones, never a
+mix. Services that build clients from settings register with subscribe() and
+are told which keys changed.
+"""
+
+import asyncio
+import logging
+from typing import Callable
+
+log = logging.getLogger(__name__)
+
+
+class SettingsCache:
+    def __init__(self):
+        self._values: dict[str, str] = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self._subscribers: list[tuple[frozenset[str] | None, Callable[[dict], None]]] = []
+        self.loads = 0
+        self.updates = 0
+
+    async def load(self):
+        """(Re)read every setting from the database."""
+        from sqlalchemy import select
+        from app.database import async_session
+        from app.models import Setting
+        async with self._lock:
+            async with async_session() as db:
+                rows = (await db.execute(select(Setting.key, Setting.value))).all()
+            self._values = {key: value or "" for key, value in rows}
+            self._loaded = True
+            self.loads += 1
+
+    async def _ensure_loaded(self):
+        if not self._loaded:
+            await self.load()
+
+    async def get(self, key: str, default: str = "") -> str:
+        """A setting's value, or default if it is unset or empty."""
+        await self._ensure_loaded()
+        return self._values.get(key) or default
+
+    async def get_many(self, keys) -> dict[str, str]:
+        """Values for keys from one snapshot; unset keys map to ""."""
+        await self._ensure_loaded()
+        values = self._values
+        return {k: values.get(k) or "" for k in keys}
+
+    async def all(self) -> dict[str, str]:
+        await self._ensure_loaded()
+        return dict(self._values)
+
+    async def update(self, values: dict) -> dict[str, str]:
+        """Upsert settings in one statement and publish them. Returns the keys that changed."""
+        from sqlalchemy.dialects.sqlite import insert
+        from app.database import async_session
+        from app.models import Setting
+        await self._ensure_loaded()
+        async with self._lock:
+            changed = {k: str(v) for k, v in values.items() if self._values.get(k) != str(v)}
+            if not changed:
+                return {}
+            stmt = insert(Setting).values([{"key": k, "value": v} for k, v in changed.items()])
+            stmt = stmt.on_conflict_do_update(index_elements=[Setting.key], set_={"value": stmt.excluded.value})
+            async with async_session() as db:
+                await db.execute(stmt)
+                await db.commit()
+            self._values = {**self._values, **changed}
+            self.updates += 1
+        self._notify(changed)
+        return changed
+
+    def subscribe(self, callback: Callable[[dict], None], keys=None):
+        """Call callback(changed) after an update touching any of keys (all keys if None)."""
+        self._subscribers.append((frozenset(keys) if keys is not None else None, callback))
+
+    def _notify(self, changed: dict):
+        for keys, callback in self._subscribers:
+            if keys is not None and not keys & changed.keys():
+                continue
+            try:
+                callback(changed)
+            except Exception:
+                log.exception("Settings subscriber %r failed", callback)
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self._loaded,
+            "keys": len(self._values),
+            "loads": self.loads,
+            "updates": self.updates,
+            "subscribers": len(self._subscribers),
+        }
+
+
+settings_cache = SettingsCache()
@@ -0,0 +1,84 @@
+"""Submit, or re-attach to, the ACE-Step task behind a queued job.
+
+As soon as ACE-Step accepts a task, its id and backend URL are committed on
+the Job row (phase "submitted"). If the app restarts mid-render, the job
+queue puts the job back in the queue and its handler calls run_task() again:
+instead of submitting a second time it re-pins the stored task to its backend
+and resumes polling, so a render that finished while the app was down is
+still collected. If the stored task cannot be resumed (ACE-Step lost it or
+reports it failed), the job is submitted once more.
+"""
+
+import logging
+
+import httpx
+
+from app.models import Job
+from app.services import music as music_svc
+from app.services.backends import backend_pool
+from app.services.circuit import CircuitOpenError
+from app.services.job_queue import job_queue, Requeue
+from app.services.job_state import job_state
+
+log = logging.getLogger(__name__)
+
+# Phases in which a job has a live ACE-Step task worth re-attaching to
+RESUMABLE_PHASES = ("submitted", "downloading")
+
+
+async def submit(db, job: Job, params: dict) -> str:
+    """Submit params to ACE-Step for a job and record the task on the Job row."""
+    job_queue.checkpoint(job.id)
+    try:
+        submit_result = await music_svc.submit_task(params)
+    except (CircuitOpenError, httpx.ConnectError) as e:
+        # Nothing reached ACE-Step; keep the job's place in the queue
+        raise Requeue("ACE-Step unavailable") from e
+    # Response may be wrapped: {"data": {"task_id": ...}, "code": 200}
+    payload = submit_result.get("data", submit_result) if isinstance(submit_result, dict) else submit_result
+    task_id = payload.get("task_id") if isinstance(payload, dict) else None
+    if not task_id:
+        raise RuntimeError(f"No task_id in ACE-Step response: {submit_result}")
+    job_queue.submitted(job.id, task_id)
+
+    job.backend_task_id = task_id
+    job.backend_url = backend_pool.pinned(task_id)
+    job.phase = "submitted"
+    await db.commit()
+    return task_id
+
+
+def _reattach(job: Job) -> str | None:
+    if not job.backend_task_id or job.phase not in RESUMABLE_PHASES:
+        return None
+    backend_pool.reattach(job.backend_task_id, job.backend_url)
+    job_queue.submitted(job.id, job.backend_task_id)
+    log.info("Job %s: re-attaching to ACE-Step task %s on %s", job.id, job.backend_task_id, job.backend_url)
+    return job.backend_task_id
+
+
+async def run_task(db, job: Job, params: dict, on_progress=None) -> tuple[str, dict]:
+    """Resume the job's stored ACE-Step task, or submit params, and poll to completion.
+
+    Returns (task_id, final result entry).
+    """
+    async def report(result: dict):
+        # Until ACE-Step shows progress the task is only queued there, and the
+        # job queue may pre-empt it for higher-priority work
+        if result.get("status", 0) != 0 or music_svc.entry_progress(result):
+            job_queue.rendering(job.id)
+        if on_progress:
+            await on_progress(result)
+
+    task_id = _reattach(job)
+    if task_id:
+        job_state.save(job, stage="Resuming...")
+        try:
+            return task_id, await music_svc.poll_until_done(task_id, on_progress=report)
+        except (RuntimeError, TimeoutError) as e:
+            log.warning("Job %s: could not resume task %s (%s); submitting again", job.id, task_id, e)
+            job_state.save(job, progress=0.0, stage="Resubmitting...", eta_seconds=None)
+
+    task_id = await submit(db, job, dict(params))
+    job_state.save(job, stage="Generating music...")
+    return task_id, await music_svc.poll_until_done(task_id, on_progress=report)
@@ -34,14 +34,12 @@ _DEFAULT_SIZE = {
 
 
 async def _get_model_size() -> str:
-    """Read tts_model_size from settings DB. Returns '0.6B' or '1.7B'."""
+    """Read tts_model_size from settings. Returns '0.6B' or '1.7B'."""
     try:
-        from app.database import async_session
-        from app.models import Setting
-        async with async_session() as db:
-            row = await db.get(Setting, "tts_model_size")
-            if row and row.value in ("0.6B", "1.7B"):
-                return row.value
+        from app.services.settings_cache import settings_cache
+        size = await settings_cache.get("tts_model_size")
+        if size in ("0.6B", "1.7B"):
+            return size
     except Exception:
         pass
     return "0.6B"
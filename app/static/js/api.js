@@ -1,7 +1,14 @@
 const BASE = '';
 
+// Stable per-browser id so the job queue can share ACE-Step fairly between clients
+const CLIENT_ID = localStorage.getItem('clientId') || (() => {
+  const id = crypto.randomUUID ? crypto.randomUUID() : String(Date.now()) + Math.random().toString(16).slice(2);
+  localStorage.setItem('clientId', id);
+  return id;
+})();
+
 async function request(method, path, body) {
-  const opts = { method, headers: {} };
+  const opts = { method, headers: { 'X-Client-Id': CLIENT_ID } };
   if (body !== undefined) {
     opts.headers['Content-Type'] = 'application/json';
     opts.body = JSON.stringify(body);
@@ -23,8 +30,9 @@ async function uploadForm(method, path, formData) {
 export const api = {
   // Songs
   getSongs: (q = '', offset = 0, limit = 50) =>
-    request('GET', `/api/songs?q=${encodeURIComponent(q)}&offset=${offset}&limit=${limit}`),
+    request('GET', `/api/songs?q=${encodeURIComponent(q)}&offset=${offset}&limit=${limit}&fields=summary`),
   getSong: (id) => request('GET', `/api/songs/${id}`),
+  getVariations: (id) => request('GET', `/api/songs/${id}/variations`),
   updateSong: (id, data) => request('POST', `/api/songs/${id}`, data),
   deleteSong: (id) => request('DELETE', `/api/songs/${id}`),
   audioUrl: (id) => `/api/songs/${id}/audio`,
@@ -34,6 +42,7 @@ export const api = {
   // Create
   createSimple: (data) => request('POST', '/api/create/simple', data),
   createCustom: (data) => request('POST', '/api/create/custom', data),
+  createVariations: (data) => request('POST', '/api/create/variations', data),
 
   // Lyrics
   generateLyrics: (data) => request('POST', '/api/lyrics/generate', data),
@@ -67,11 +76,25 @@ export const api = {
 
   // Jobs
   getJob: (id) => request('GET', `/api/jobs/${id}`),
+  getJobStats: () => request('GET', '/api/jobs/stats'),
+  cancelJob: (id) => request('POST', `/api/jobs/${id}/cancel`),
   streamJob: (id) => new EventSource(`/api/jobs/${id}/stream`),
+  getJobs: (ids) => request('GET', `/api/jobs?ids=${ids.map(encodeURIComponent).join(',')}`),
+  getMyJobs: () => request('GET', `/api/jobs?client=${encodeURIComponent(CLIENT_ID)}`),
+  // One stream for many jobs; without ids it follows all of this browser's jobs
+  jobFeed: (ids) => new EventSource(ids
+    ? `/api/jobs/feed?ids=${ids.map(encodeURIComponent).join(',')}`
+    : `/api/jobs/feed?client=${encodeURIComponent(CLIENT_ID)}`),
 
   // Settings
   getSettings: () => request('GET', '/api/settings'),
   updateSettings: (data) => request('PUT', '/api/settings', data),
   getLlmModels: () => request('GET', '/api/settings/llm/models'),
   getGrpcModels: () => request('GET', '/api/settings/grpc/models'),
+  getBackends: () => request('GET', '/api/settings/backends'),
+  addBackend: (data) => request('POST', '/api/settings/backends', data),
+  removeBackend: (url) => request('DELETE', `/api/settings/backends?url=${encodeURIComponent(url)}`),
+
+  // Health
+  getHealth: () => request('GET', '/api/health'),
 };
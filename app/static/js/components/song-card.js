@@ -20,6 +20,8 @@ export function renderSongCard(song) {
     ? '<span class="badge badge-generating">Generating</span>'
     : song.status === 'failed'
     ? '<span class="badge badge-failed">Failed</span>'
+    : song.status === 'cancelled'
+    ? '<span class="badge badge-failed">Cancelled</span>'
     : '';
 
   el.innerHTML = `
@@ -176,7 +176,9 @@ export async function renderCreateCustom(container) {
           try {
             const job = await api.getJob(result.job_id);
             progressBar.style.width = `${(job.progress || 0) * 100}%`;
-            stageEl.textContent = job.stage || 'Processing...';
+            const eta = job.queue_position ? ` (#${job.queue_position} in queue)`
+              : job.eta_seconds ? ` (~${Math.ceil(job.eta_seconds)}s left)` : '';
+            stageEl.textContent = (job.stage || 'Processing...') + eta;
 
             if (job.status === 'completed') {
               clearInterval(poll);
@@ -186,9 +188,9 @@ export async function renderCreateCustom(container) {
               } else {
                 window.location.hash = '#/library';
               }
-            } else if (job.status === 'failed') {
+            } else if (job.status === 'failed' || job.status === 'cancelled') {
               clearInterval(poll);
-              toast(job.error || 'Generation failed', 'error');
+              toast(job.status === 'cancelled' ? 'Generation cancelled' : (job.error || 'Generation failed'), 'error');
               btn.disabled = false;
               btn.textContent = 'Create Song';
             }
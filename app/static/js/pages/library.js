@@ -32,7 +32,27 @@ export async function renderLibrary(container) {
     songs.forEach(song => {
       listEl.appendChild(renderSongCard(song));
     });
+
+    if (songs.some(song => song.status === 'generating')) {
+      watchJobs(container, listEl);
+    }
   } catch (e) {
     toast('Failed to load songs', 'error');
   }
 }
+
+// Re-render once any of this browser's jobs finishes, over a single feed for all of them
+function watchJobs(container, listEl) {
+  const feed = api.jobFeed();
+  feed.addEventListener('update', (e) => {
+    if (!document.body.contains(listEl)) {
+      feed.close();
+      return;
+    }
+    const { jobs } = JSON.parse(e.data);
+    if (jobs.some(job => ['completed', 'failed', 'cancelled'].includes(job.status))) {
+      feed.close();
+      renderLibrary(container);
+    }
+  });
+}
@@ -0,0 +1,164 @@
+"""Concurrent read/write throughput of the app's SQLite setup, before and after tuning.
+
+Runs the same mixed workload against a scratch database in three setups:
+
+- "default": a plain create_async_engine() with SQLite's defaults
+  (rollback journal, synchronous=FULL) and unsynchronized writers,
+- "pragmas": app.database's connection setup (WAL, busy_timeout,
+  synchronous=NORMAL, cache/mmap) with plain sessions,
+- "tuned": the same, with sessions that take turns on the write lock, as the
+  app uses them.
+
+Readers page through the song library; writers mimic job progress updates
+(read-modify-write of a job row) and song inserts. Reports operations per
+second, latency percentiles and "database is locked" errors.
+
+Usage (from the repository root):
+
+    python benchmarks/sqlite_concurrency.py [--seconds 10] [--readers 8] [--writers 4]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import desc, select  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker  # noqa: E402
+
+from app.database import Base, create_engine, session_factory  # noqa: E402
+from app.models import Job, Song  # noqa: E402
+
+SEED_SONGS = 2000
+SEED_JOBS = 200
+
+
+class Result:
+    def __init__(self):
+        self.latencies = {"read": [], "write": []}
+        self.errors = {"read": 0, "write": 0}
+
+    def record(self, kind: str, seconds: float):
+        self.latencies[kind].append(seconds)
+
+
+async def _seed(sessions):
+    async with sessions() as db:
+        db.add_all(Song(title=f"Song {i}", caption="lofi, rain", lyrics="la " * 200) for i in range(SEED_SONGS))
+        db.add_all(Job(id=str(uuid.uuid4()), job_type="custom_create", status="running") for _ in range(SEED_JOBS))
+        await db.commit()
+        return list((await db.execute(select(Job.id))).scalars())
+
+
+async def _reader(sessions, result: Result, deadline: float):
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            async with sessions() as db:
+                offset = random.randrange(0, SEED_SONGS - 50)
+                await db.execute(select(Song).order_by(desc(Song.created_at)).offset(offset).limit(50))
+            result.record("read", time.monotonic() - started)
+        except OperationalError:
+            result.errors["read"] += 1
+
+
+async def _writer(sessions, result: Result, deadline: float, job_ids: list[str]):
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            async with sessions() as db:
+                if random.random() < 0.8:
+                    # Progress update: read the row, then write it back
+                    job = await db.get(Job, random.choice(job_ids))
+                    job.progress = random.random()
+                    job.stage = f"step {job.progress:.2f}"
+                else:
+                    db.add(Song(title="New song", caption="benchmark"))
+                await db.commit()
+            result.record("write", time.monotonic() - started)
+        except OperationalError:
+            result.errors["write"] += 1
+
+
+async def _slow_writer(sessions, result: Result, deadline: float, hold: float):
+    """A write transaction kept open across an await, like a handler that
+    flushes and then waits on a backend before committing."""
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            async with sessions() as db:
+                db.add(Song(title="Slow song", caption="benchmark"))
+                await db.flush()
+                await asyncio.sleep(hold)
+                await db.commit()
+            result.record("write", time.monotonic() - started)
+        except OperationalError:
+            result.errors["write"] += 1
+        await asyncio.sleep(hold)
+
+
+async def run(mode: str, seconds: float, readers: int, writers: int, slow_writers: int, hold: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}"
+        engine = create_engine(url, tuned=mode != "default")
+        if mode == "tuned":
+            sessions = session_factory(engine)
+        else:
+            sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        job_ids = await _seed(sessions)
+
+        result = Result()
+        deadline = time.monotonic() + seconds
+        await asyncio.gather(
+            *(_reader(sessions, result, deadline) for _ in range(readers)),
+            *(_writer(sessions, result, deadline, job_ids) for _ in range(writers)),
+            *(_slow_writer(sessions, result, deadline, hold) for _ in range(slow_writers)),
+        )
+        await engine.dispose()
+
+    report = {"mode": mode}
+    for kind in ("read", "write"):
+        latencies = sorted(result.latencies[kind])
+        report[f"{kind}s/s"] = round(len(latencies) / seconds, 1)
+        report[f"{kind} p50 ms"] = round(statistics.median(latencies) * 1000, 1) if latencies else None
+        report[f"{kind} p95 ms"] = round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None
+        report[f"{kind} errors"] = result.errors[kind]
+    return report
+
+
+def _print_table(reports: list[dict]):
+    columns = list(reports[0])
+    widths = {c: max(len(c), *(len(str(r[c])) for r in reports)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for r in reports:
+        print("  ".join(str(r[c]).ljust(widths[c]) for c in columns))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--slow-writers", type=int, default=0)
+    parser.add_argument("--hold", type=float, default=1.0, help="seconds a slow writer keeps its transaction open")
+    args = parser.parse_args()
+
+    reports = [
+        await run(mode, args.seconds, args.readers, args.writers, args.slow_writers, args.hold)
+        for mode in ("default", "pragmas", "tuned")
+    ]
+    _print_table(reports)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())